@@ -0,0 +1,230 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .index import db
+from .models import PR, SyncState
+from .bitbucket import get_bitbucket_client
+from .chunking import estimate_tokens
+from .jobs import enqueue_new_reviews, store_pr_files
+from .utils import prepare_pr, review_files_diff, pr_file_records, handle_date
+
+# Full import of a repository's PRs. PRs are walked in ascending id order and each page is committed together with
+# a checkpoint (the highest PR id of the page), so a crashed or stopped backfill resumes after the last committed
+# page. Diffs and file contents are fetched by one thread pool and the LLM reviews run in a second pool; both draw
+# from the shared Groq and Bitbucket budgets in rate_limit.
+
+BACKFILL_CHECKPOINT_KEY = 'backfill_last_pr_id'
+
+class BackfillProgress:
+    """
+    Thread-safe counters for a running backfill, reported as PRs/min and tokens/min.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.started_at = None
+        self.finished_at = None
+        self.prs_done = 0
+        self.prs_failed = 0
+        self.tokens = 0
+        self.checkpoint = None
+        self.error = None
+
+    def start(self, checkpoint):
+        with self._lock:
+            self.running = True
+            self.started_at = time.time()
+            self.finished_at = None
+            self.prs_done = self.prs_failed = self.tokens = 0
+            self.checkpoint = checkpoint
+            self.error = None
+
+    def record(self, done=0, failed=0, tokens=0, checkpoint=None):
+        with self._lock:
+            self.prs_done += done
+            self.prs_failed += failed
+            self.tokens += tokens
+            if checkpoint is not None:
+                self.checkpoint = checkpoint
+
+    def finish(self, error=None):
+        with self._lock:
+            self.running = False
+            self.finished_at = time.time()
+            self.error = error
+
+    def snapshot(self):
+        with self._lock:
+            end = self.finished_at or time.time()
+            minutes = (end - self.started_at) / 60 if self.started_at else 0
+            return {
+                'running': self.running,
+                'checkpoint': self.checkpoint,
+                'prs_done': self.prs_done,
+                'prs_failed': self.prs_failed,
+                'tokens': self.tokens,
+                'elapsed_seconds': round(minutes * 60, 1),
+                'prs_per_minute': round(self.prs_done / minutes, 2) if minutes else 0,
+                'tokens_per_minute': round(self.tokens / minutes, 1) if minutes else 0,
+                'error': self.error,
+            }
+
+progress = BackfillProgress()
+_backfill_lock = threading.Lock()
+
+def get_checkpoint():
+    state = db.session.get(SyncState, BACKFILL_CHECKPOINT_KEY)
+    return int(state.value) if state and state.value else 0
+
+def fetch_pr_pages(after_pr_id):
+    """
+    Yield pages of PRs with an id greater than after_pr_id, in ascending id order. The next page is fetched in the
+    background while the caller processes the current one.
+    """
+    client = get_bitbucket_client()
+
+    def fetch(url, params):
+        response = client.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    with ThreadPoolExecutor(max_workers=1) as prefetcher:
+        future = prefetcher.submit(fetch, f"{client.repo_url}/pullrequests",
+                                   {'state': 'ALL', 'pagelen': 50, 'q': f'id > {after_pr_id}', 'sort': 'id'})
+        while future is not None:
+            data = future.result()
+            future = prefetcher.submit(fetch, data['next'], None) if data.get('next') else None
+            yield data['values']
+
+def review_page(app, prs, fetch_pool, review_pool):
+    """
+    Prepare and review every PR of a page concurrently. Returns
+    {pr_id: (raw_diff, processed_diff, feedback, tokens, pr_files)} for the PRs that succeeded.
+    """
+    def review(pr_id, prepared, stats):
+        raw_files_diff, files_diff, processed_diff = prepared
+        with app.app_context():
+            feedback = review_files_diff(pr_id, files_diff)
+        tokens = stats.get('prompt_tokens', 0) + estimate_tokens(feedback)
+        return raw_files_diff, processed_diff, feedback, tokens, pr_file_records(files_diff)
+
+    def prepare(pr_id, target_branch):
+        stats = {}
+        return prepare_pr(pr_id, target_branch, stats=stats), stats
+
+    prepare_futures = {
+        fetch_pool.submit(prepare, str(pr_data['id']), pr_data['destination']['branch']['name']): str(pr_data['id'])
+        for pr_data in prs
+    }
+    review_futures = {}
+    for future in as_completed(prepare_futures):
+        pr_id = prepare_futures[future]
+        try:
+            prepared, stats = future.result()
+        except Exception as e:
+            logging.error(f"Backfill: failed to fetch PR {pr_id}: {e}")
+            continue
+        review_futures[review_pool.submit(review, pr_id, prepared, stats)] = pr_id
+
+    results = {}
+    for future in as_completed(review_futures):
+        pr_id = review_futures[future]
+        try:
+            results[pr_id] = future.result()
+        except Exception as e:
+            logging.error(f"Backfill: failed to review PR {pr_id}: {e}")
+    return results
+
+def run_backfill(app):
+    """
+    Import and review every PR after the stored checkpoint. Pages are committed one at a time together with the
+    new checkpoint. PRs that fail to fetch or review are stored without feedback and queued for the review workers,
+    so one bad PR never stops the backfill.
+    """
+    fetch_workers = int(os.getenv("BACKFILL_FETCH_WORKERS", 4))
+    review_workers = int(os.getenv("BACKFILL_REVIEW_WORKERS", 2))
+
+    with app.app_context():
+        checkpoint = get_checkpoint()
+        progress.start(checkpoint)
+        logging.info(f"Starting backfill after PR {checkpoint}")
+        try:
+            with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+                    ThreadPoolExecutor(max_workers=review_workers) as review_pool:
+                for prs in fetch_pr_pages(checkpoint):
+                    if not prs:
+                        continue
+                    pr_ids = [str(pr_data['id']) for pr_data in prs]
+                    existing = {pr_id for (pr_id,) in db.session.query(PR.pr_id).filter(PR.pr_id.in_(pr_ids)).all()}
+                    new_prs = [pr_data for pr_data in prs if str(pr_data['id']) not in existing]
+                    results = review_page(app, new_prs, fetch_pool, review_pool)
+
+                    rows = []
+                    failed = []
+                    pr_files = {}
+                    page_tokens = 0
+                    for pr_data in new_prs:
+                        pr_id = str(pr_data['id'])
+                        row = {
+                            'pr_id': pr_id,
+                            'title': pr_data.get('title', 'No Title'),
+                            'status': pr_data.get('state'),
+                            'sourceBranchName': pr_data['source']['branch']['name'],
+                            'targetBranchName': pr_data['destination']['branch']['name'],
+                            'lastCommitHash': pr_data['source']['commit']['hash'],
+                            'created_date': handle_date(pr_data.get('created_on')),
+                            'last_modified': handle_date(pr_data.get('updated_on')),
+                        }
+                        if pr_id in results:
+                            raw_files_diff, processed_diff, feedback, tokens, records = results[pr_id]
+                            row.update(rawDiff=raw_files_diff, content=processed_diff, initialFeedback=feedback, feedback=feedback)
+                            pr_files[pr_id] = (row['lastCommitHash'], records)
+                            page_tokens += tokens
+                        else:
+                            # Stored without a review; the queued job sets lastCommitHash once it succeeds
+                            failed.append(dict(row))
+                            row['lastCommitHash'] = None
+                        db.session.add(PR(**row))
+                        rows.append(row)
+
+                    # The PR rows must exist before their files are inserted
+                    db.session.flush()
+                    for pr_id, (commit_hash, records) in pr_files.items():
+                        store_pr_files(pr_id, commit_hash, records)
+                    enqueue_new_reviews(failed)
+                    checkpoint = max(int(pr_id) for pr_id in pr_ids)
+                    db.session.merge(SyncState(key=BACKFILL_CHECKPOINT_KEY, value=str(checkpoint)))
+                    db.session.commit()
+
+                    progress.record(done=len(rows) - len(failed), failed=len(failed), tokens=page_tokens, checkpoint=checkpoint)
+                    snapshot = progress.snapshot()
+                    logging.info(f"Backfill checkpoint {checkpoint}: {snapshot['prs_done']} PRs reviewed, "
+                                 f"{snapshot['prs_per_minute']} PRs/min, {snapshot['tokens_per_minute']} tokens/min")
+            progress.finish()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Backfill stopped at checkpoint {checkpoint}: {e}")
+            progress.finish(error=str(e))
+            raise
+
+def start_backfill(app):
+    """
+    Run the backfill in a background thread. Returns False if one is already running in this process.
+    """
+    if not _backfill_lock.acquire(blocking=False):
+        return False
+
+    def target():
+        try:
+            run_backfill(app)
+        except Exception:
+            # Already logged and recorded in progress by run_backfill
+            pass
+        finally:
+            _backfill_lock.release()
+
+    threading.Thread(target=target, name="backfill", daemon=True).start()
+    return True
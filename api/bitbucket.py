@@ -0,0 +1,116 @@
+import os
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+from dotenv import load_dotenv
+from .rate_limit import acquire, call_with_backoff
+
+# Load environment variables from the .env file
+load_dotenv()
+
+# Overridable so the app can be pointed at a local stand-in, see api/scripts/fake_services.py
+TOKEN_URL = os.getenv("BITBUCKET_TOKEN_URL", "https://bitbucket.org/site/oauth2/access_token")
+API_URL = os.getenv("BITBUCKET_API_URL", "https://api.bitbucket.org/2.0")
+
+class BitbucketClient:
+    """
+    Reusable Bitbucket Cloud client.
+    Caches the OAuth access token until shortly before it expires, refreshes it once when a request comes back
+    with a 401, and sends every call through a single keep-alive connection pool. Calls draw from the shared
+    'bitbucket_requests' budget and are retried with backoff when Bitbucket throttles them.
+    """
+
+    # Refresh the token slightly before Bitbucket expires it so in-flight requests don't race the expiry
+    TOKEN_EXPIRY_MARGIN = 60
+
+    def __init__(self, key=None, secret=None, workspace=None, repo_slug=None, pool_size=None):
+        self.key = key or os.getenv("BITBUCKET_KEY")
+        self.secret = secret or os.getenv("BITBUCKET_SECRET")
+        self.workspace = workspace or os.getenv("BITBUCKET_WORKSPACE")
+        self.repo_slug = repo_slug or os.getenv("BITBUCKET_REPO_SLUG")
+        pool_size = pool_size or int(os.getenv("BITBUCKET_POOL_SIZE", 10))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._token = None
+        self._token_expires_at = 0
+        self._token_lock = threading.Lock()
+
+    @property
+    def repo_url(self):
+        return f"{API_URL}/repositories/{self.workspace}/{self.repo_slug}"
+
+    def _fetch_token(self):
+        response = self.session.post(
+            TOKEN_URL,
+            data={"grant_type": "client_credentials"},
+            auth=HTTPBasicAuth(self.key, self.secret)
+        )
+        if response.status_code != 200:
+            logging.error(f"Failed to get access token: {response.status_code}, {response.text}")
+            raise Exception("Failed to get access token")
+        token_data = response.json()
+        self._token = token_data.get("access_token")
+        self._token_expires_at = time.monotonic() + int(token_data.get("expires_in", 3600)) - self.TOKEN_EXPIRY_MARGIN
+        return self._token
+
+    def get_token(self, force_refresh=False, stale_token=None):
+        """
+        Return a valid access token, requesting a new one only when the cached token is missing or expired.
+        When force_refresh is set, the token is only replaced if it is still the stale one the caller saw, so
+        concurrent 401s trigger a single refresh.
+        """
+        with self._token_lock:
+            if force_refresh and self._token is not None and self._token != stale_token:
+                return self._token
+            if force_refresh or self._token is None or time.monotonic() >= self._token_expires_at:
+                return self._fetch_token()
+            return self._token
+
+    def request(self, method, url, **kwargs):
+        """
+        Send an authenticated request. A 401 response causes one token refresh and one retry.
+        """
+        if not url.startswith("http"):
+            url = f"{self.repo_url}/{url.lstrip('/')}"
+
+        token = self.get_token()
+        response = self._send(method, url, token, **kwargs)
+        if response.status_code == 401:
+            logging.info("Bitbucket access token rejected, refreshing and retrying once.")
+            token = self.get_token(force_refresh=True, stale_token=token)
+            response = self._send(method, url, token, **kwargs)
+        return response
+
+    def _send(self, method, url, token, headers=None, **kwargs):
+        headers = dict(headers or {})
+        headers['Authorization'] = f'Bearer {token}'
+
+        def send():
+            acquire('bitbucket_requests')
+            return self.session.request(method, url, headers=headers, **kwargs)
+
+        return call_with_backoff('bitbucket_requests', send)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_bitbucket_client():
+    """
+    Return the process-wide Bitbucket client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = BitbucketClient()
+    return _client
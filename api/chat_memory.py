@@ -0,0 +1,143 @@
+import os
+import logging
+import threading
+from sqlalchemy import update
+from .index import db
+from .models import Conversation, ConversationMemory
+from .llm import get_llm_gateway, prompts
+from .chunking import estimate_tokens
+from .utils import get_model_name
+
+# Conversation memory for the PR chat. The most recent turns are sent verbatim as chat messages, within
+# CHAT_MEMORY_TURNS turns and CHAT_MEMORY_TOKENS tokens. Every other turn is folded into a rolling summary stored per
+# PR in the conversation_memory table. The summary is updated in the background after each answer, and only with the
+# turns that have left the verbatim window since the last update; a question is never delayed by summarising.
+
+# Roles stored in the convo table mapped to chat message roles
+CHAT_ROLES = {'User': 'user', 'System': 'assistant'}
+
+def memory_settings():
+    return int(os.getenv("CHAT_MEMORY_TURNS", 6)), int(os.getenv("CHAT_MEMORY_TOKENS", 2000))
+
+def get_memory(pr_id):
+    return db.session.get(ConversationMemory, pr_id)
+
+def unsummarized_turns(pr_id, summarized_until_id):
+    return Conversation.query.filter(
+        Conversation.pr_id == pr_id,
+        Conversation.id > summarized_until_id
+    ).order_by(Conversation.date_created.asc(), Conversation.id.asc()).all()
+
+def recent_turns(turns, max_turns, max_tokens):
+    """
+    The newest turns that fit in max_turns and max_tokens, oldest first.
+    """
+    selected = []
+    used_tokens = 0
+    for turn in reversed(turns[-max_turns:] if max_turns > 0 else []):
+        tokens = estimate_tokens(turn.message)
+        if used_tokens + tokens > max_tokens:
+            break
+        selected.append(turn)
+        used_tokens += tokens
+    selected.reverse()
+    return selected
+
+def split_turns(turns, reserve_turns=0):
+    """
+    Split unsummarized turns into (expired, recent): the recent ones are sent verbatim, every other one belongs in
+    the summary. reserve_turns leaves that many turns of the window free.
+    """
+    max_turns, max_tokens = memory_settings()
+    if max_turns > 0:
+        max_turns = max(max_turns - reserve_turns, 1)
+    recent = recent_turns(turns, max_turns, max_tokens)
+    return turns[:len(turns) - len(recent)], recent
+
+def get_or_create_memory(pr_id):
+    memory = get_memory(pr_id)
+    if memory is None:
+        memory = ConversationMemory(pr_id=pr_id, summary=None, summarized_until_id=0)
+        db.session.add(memory)
+        db.session.commit()
+    return memory
+
+def fold_turns(memory, expired):
+    """
+    Fold expired, the oldest unsummarized turns, into the PR's rolling summary. The update is conditional on
+    summarized_until_id, so two concurrent updates can't overwrite each other's summary.
+    """
+    transcript = "\n\n".join(f"{turn.role}: {turn.message}" for turn in expired)
+    summary = get_llm_gateway().chat(
+        [
+            {"role": "system", "content": prompts.get('chatSummaryPrompt')},
+            {"role": "user", "content": f"Current summary:\n{memory.summary or '(empty)'}\n\nNext messages:\n{transcript}"}
+        ],
+        model=get_model_name(),
+        temperature=0.2,
+        max_tokens=int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", 400)),
+    )
+    result = db.session.execute(
+        update(ConversationMemory)
+        .where(ConversationMemory.pr_id == memory.pr_id,
+               ConversationMemory.summarized_until_id == memory.summarized_until_id)
+        .values(summary=summary, summarized_until_id=max(turn.id for turn in expired))
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+def build_chat_messages(pr_entry, user_message, context=None):
+    """
+    Builds the chat messages for a user's question about a PR: the groqPrompt instructions with the PR context and
+    the conversation summary as the system message, then the recent turns and the question as user/assistant
+    messages. context defaults to the PR contents; the initial feedback is always included.
+    """
+    memory = get_memory(pr_entry.pr_id)
+    summarized_until_id = memory.summarized_until_id if memory else 0
+    turns = unsummarized_turns(pr_entry.pr_id, summarized_until_id)
+    # The client saves the question before asking it, so it is usually the last stored turn
+    if turns and turns[-1].role == 'User' and turns[-1].message == user_message:
+        turns = turns[:-1]
+
+    # Turns that have left the window but aren't in the summary yet (e.g. after a long answer) are not summarised
+    # here, which would add an LLM call to the request; the background update after this answer folds them in
+    _, recent = split_turns(turns)
+
+    if not pr_entry.initialFeedback:
+        pr_entry.initialFeedback = pr_entry.feedback
+    system_prompt = prompts.get('groqPrompt')
+    system_prompt += "\nPull request contents: " + ((pr_entry.content or "") if context is None else context)
+    system_prompt += "\nYour initial feedback of the pull request: " + (pr_entry.initialFeedback or "")
+    if memory and memory.summary:
+        system_prompt += "\nSummary of the earlier conversation between you and the user:\n" + memory.summary
+
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend({"role": CHAT_ROLES.get(turn.role, 'user'), "content": turn.message} for turn in recent)
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def update_memory(pr_id):
+    """
+    Fold every turn outside the verbatim window into the PR's rolling summary. Two turns of the window are kept
+    free for the answer and the next question, so the next question rarely has to summarise before it is sent.
+    """
+    memory = get_or_create_memory(pr_id)
+    turns = unsummarized_turns(pr_id, memory.summarized_until_id)
+    expired, _ = split_turns(turns, reserve_turns=2)
+    if not expired:
+        return False
+    return fold_turns(memory, expired)
+
+def schedule_memory_update(app, pr_id):
+    """
+    Update the PR's conversation summary in a background thread, so the answer isn't delayed by it.
+    """
+    def target():
+        with app.app_context():
+            try:
+                update_memory(pr_id)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Error updating conversation memory for PR {pr_id}: {e}")
+
+    threading.Thread(target=target, name=f"chat-memory-{pr_id}", daemon=True).start()
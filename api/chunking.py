@@ -0,0 +1,235 @@
+import re
+
+# Rough characters-per-token ratio for code with the llama3 tokenizer. Used for budgeting only, so it errs on the
+# side of overestimating.
+CHARS_PER_TOKEN = 3.5
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens in text without needing the model's tokenizer.
+    """
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+def changed_line_ranges(hunks, context_lines):
+    """
+    Return the merged 1-based line ranges of the original file that the hunks touch, widened by context_lines.
+    """
+    ranges = []
+    for hunk in hunks:
+        start = max(1, hunk['old_start'] - context_lines)
+        end = hunk['old_start'] + max(hunk['old_lines'], 1) - 1 + context_lines
+        ranges.append([start, end])
+    return merge_ranges(ranges)
+
+def render_line_ranges(lines, ranges):
+    """
+    Join the given 1-based line ranges of lines, replacing every gap with an 'omitted' marker line.
+    """
+    parts = []
+    previous_end = 0
+    for start, end in ranges:
+        end = min(end, len(lines))
+        if start > end:
+            continue
+        if start > previous_end + 1:
+            parts.append(f"... (lines {previous_end + 1}-{start - 1} omitted) ...")
+        parts.extend(lines[max(start, previous_end + 1) - 1:end])
+        previous_end = max(previous_end, end)
+    if previous_end < len(lines):
+        parts.append(f"... (lines {previous_end + 1}-{len(lines)} omitted) ...")
+    return "\n".join(parts)
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def truncate_around_hunks(original_contents, hunks, max_tokens, context_lines=20):
+    """
+    Shrink the original contents of a file to the regions around its changed hunks so they fit in max_tokens.
+    Omitted regions are replaced with a marker line. The context is narrowed step by step, and as a last resort
+    the text is cut off at the budget.
+    """
+    if estimate_tokens(original_contents) <= max_tokens:
+        return original_contents
+
+    lines = original_contents.splitlines()
+    for context in (context_lines, context_lines // 4, 0):
+        if not hunks:
+            break
+        truncated = render_line_ranges(lines, changed_line_ranges(hunks, context))
+        if estimate_tokens(truncated) <= max_tokens:
+            return truncated
+
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    return original_contents[:max_chars] + "\n... (truncated) ..."
+
+# Lines that open a function or class in the languages we usually review (Python, JS/TS, Go, Rust, Java/C#)
+BLOCK_START_RE = re.compile(
+    r'^\s*(?:(?:export\s+)?(?:default\s+)?(?:async\s+)?(?:def|class|function|func|fn|interface)\b'
+    r'|(?:public|private|protected|internal|static)\b.*[({]\s*$)'
+)
+
+def _indent(line):
+    return len(line) - len(line.lstrip())
+
+def enclosing_block(lines, line_number, max_block_lines):
+    """
+    Return the (start, end) 1-based line range of the function or class enclosing line_number, found by scanning
+    upwards for a block opener with a smaller indent. Returns None if there is none or it is longer than
+    max_block_lines.
+    """
+    index = min(max(line_number, 1), len(lines)) - 1
+    while index > 0 and not lines[index].strip():
+        index -= 1
+    target_indent = _indent(lines[index]) if lines else 0
+
+    start = None
+    for i in range(index, -1, -1):
+        line = lines[i]
+        if line.strip() and BLOCK_START_RE.match(line) and (i == index or _indent(line) < target_indent):
+            start = i
+            break
+    if start is None:
+        return None
+
+    start_indent = _indent(lines[start])
+    end = start
+    for i in range(start + 1, len(lines)):
+        line = lines[i]
+        if not line.strip() or _indent(line) > start_indent:
+            end = i
+            continue
+        if line.strip()[0] in ')]}':
+            # Closing bracket of a brace-delimited block
+            end = i
+        break
+    while end > start and not lines[end].strip():
+        end -= 1
+
+    if end - start + 1 > max_block_lines:
+        return None
+    return start + 1, end + 1
+
+def extract_hunk_context(original_contents, hunks, context_lines=10, max_block_lines=150):
+    """
+    Reduce the original contents of a file to what a reviewer needs to understand its hunks: the enclosing
+    function or class of each change when it is short enough, plus context_lines lines around every hunk.
+    """
+    if not original_contents or not hunks:
+        return original_contents
+
+    lines = original_contents.splitlines()
+    ranges = changed_line_ranges(hunks, context_lines)
+    for hunk in hunks:
+        first = hunk['old_start']
+        last = hunk['old_start'] + max(hunk['old_lines'], 1) - 1
+        for line_number in {first, last}:
+            block = enclosing_block(lines, line_number, max_block_lines)
+            if block:
+                ranges.append(list(block))
+    return render_line_ranges(lines, merge_ranges(ranges))
+
+def pack_batches(token_counts, budget):
+    """
+    Greedily pack items, in order, into batches whose total token count stays within budget.
+    Returns a list of batches, each a list of item indexes. An item larger than the budget gets a batch of its own.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for index, tokens in enumerate(token_counts):
+        if current and current_tokens + tokens > budget:
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+SECTION_RE = re.compile(r'^\W*(description|suggestions)\W*$', re.IGNORECASE)
+NUMBERED_ITEM_RE = re.compile(r'^\s*\d+[.)]\s+')
+
+def split_review_sections(review):
+    """
+    Split a review in the Description/Suggestions format required by prompttext into the description text and a
+    list of suggestion items (without their numbers). A review without section titles is treated as description.
+    """
+    description = []
+    suggestions = []
+    section = 'description'
+    in_code_block = False
+
+    for line in (review or "").splitlines():
+        if line.strip().startswith("```"):
+            in_code_block = not in_code_block
+        if not in_code_block:
+            match = SECTION_RE.match(line)
+            if match:
+                section = match.group(1).lower()
+                continue
+        if section == 'description':
+            description.append(line)
+        elif not in_code_block and NUMBERED_ITEM_RE.match(line):
+            suggestions.append([NUMBERED_ITEM_RE.sub('', line, count=1)])
+        elif suggestions:
+            suggestions[-1].append(line)
+        elif line.strip():
+            suggestions.append([line])
+
+    return "\n".join(description).strip(), ["\n".join(item).strip() for item in suggestions]
+
+def format_review(description, suggestions):
+    parts = ["***Description***", description, "", "***Suggestions***"]
+    parts.extend(f"{number}. {item}" for number, item in enumerate(suggestions, start=1))
+    return "\n".join(parts)
+
+def split_review_by_file(review, paths):
+    """
+    Split the review of a batch of files into one review per path. Every file gets the batch's description and the
+    suggestions that mention its path or file name; suggestions that mention none of the files go to all of them.
+    Returns {path: review}.
+    """
+    if len(paths) == 1:
+        return {paths[0]: review}
+    description, suggestions = split_review_sections(review)
+    # A path or file name only counts as a whole word, so 'a.py' doesn't match 'data.py' or 'lib/a.py'
+    patterns = {path: re.compile('|'.join(rf'(?<![\w/.-]){re.escape(name)}(?![\w/])'
+                                          for name in {path, path.rsplit('/', 1)[-1]})) for path in paths}
+    per_file = {path: [] for path in paths}
+    for item in suggestions:
+        mentioned = [path for path in paths if patterns[path].search(item)]
+        for path in mentioned or paths:
+            per_file[path].append(item)
+    return {path: format_review(description, items) for path, items in per_file.items()}
+
+def merge_reviews(reviews):
+    """
+    Combine the reviews of several batches into a single review in the two-section Description/Suggestions format,
+    renumbering the suggestions and dropping duplicated descriptions and suggestions.
+    """
+    if len(reviews) == 1:
+        return reviews[0]
+
+    descriptions = []
+    suggestions = []
+    seen = set()
+    for review in reviews:
+        description, items = split_review_sections(review)
+        if description and description not in descriptions:
+            descriptions.append(description)
+        for item in items:
+            normalized = " ".join(item.split()).lower()
+            if item and normalized not in seen:
+                seen.add(normalized)
+                suggestions.append(item)
+
+    return format_review("\n\n".join(descriptions), suggestions)
@@ -0,0 +1,70 @@
+import os
+import zlib
+from sqlalchemy.types import TypeDecorator, LargeBinary
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Compressed storage for the large text columns of PR. Each stored value starts with a one-byte codec tag, so rows
+# written with different codecs (or before zstandard was installed) can always be read back.
+
+RAW = b'\x00'
+ZLIB = b'\x01'
+ZSTD = b'\x02'
+
+def default_codec():
+    """
+    The codec for new values: COLUMN_COMPRESSION (zstd, zlib or none), defaulting to zstd when the optional
+    zstandard package is installed and to zlib otherwise.
+    """
+    codec = os.getenv("COLUMN_COMPRESSION", "zstd" if zstandard else "zlib").lower()
+    if codec == "zstd" and zstandard is None:
+        return "zlib"
+    return codec
+
+def compress_text(text, codec=None):
+    data = text.encode('utf-8')
+    codec = codec or default_codec()
+    # Short values don't shrink enough to be worth the CPU
+    if codec == "none" or len(data) < int(os.getenv("COLUMN_COMPRESSION_MIN_BYTES", 256)):
+        return RAW + data
+    if codec == "zstd":
+        compressed = ZSTD + zstandard.ZstdCompressor(level=int(os.getenv("COLUMN_COMPRESSION_LEVEL", 3))).compress(data)
+    else:
+        compressed = ZLIB + zlib.compress(data, int(os.getenv("COLUMN_COMPRESSION_LEVEL", 6)))
+    return compressed if len(compressed) < len(data) + 1 else RAW + data
+
+def decompress_text(value):
+    value = bytes(value)
+    tag, data = value[:1], value[1:]
+    if tag == ZLIB:
+        data = zlib.decompress(data)
+    elif tag == ZSTD:
+        if zstandard is None:
+            raise Exception("Value is zstd-compressed but the zstandard package is not installed")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif tag != RAW:
+        raise Exception(f"Unknown compression tag {tag!r}")
+    return data.decode('utf-8')
+
+class CompressedText(TypeDecorator):
+    """
+    A Text column stored compressed in a binary column. Python code reads and writes str as usual.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            # Not converted yet (SQLite keeps the declared type of a value, not of its column)
+            return value
+        return decompress_text(value)
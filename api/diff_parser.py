@@ -0,0 +1,190 @@
+import io
+import codecs
+import re
+
+NEW_FILE_PLACEHOLDER = "<This is a new file with no original content.>"
+
+HUNK_HEADER_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)$')
+
+def iter_diff_lines(source):
+    """
+    Yield the lines of a diff one at a time without their line endings.
+    source may be the diff text, a file-like object, or any iterable of str/bytes lines (e.g. response.iter_lines()),
+    so the whole diff never has to be split into a list in memory.
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    for line in source:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        yield line.rstrip('\r\n')
+
+def _unquote(path):
+    # git quotes paths containing special characters, e.g. "a/dir with \"quotes\""
+    if len(path) >= 2 and path[0] == '"' and path[-1] == '"':
+        path = codecs.escape_decode(path[1:-1].encode('utf-8'))[0].decode('utf-8', errors='replace')
+    return path
+
+def _strip_prefix(path, prefix):
+    """
+    Remove exactly one leading 'a/' or 'b/' prefix. Paths such as 'data/b/x.py' are left intact.
+    """
+    path = _unquote(path)
+    if path == '/dev/null':
+        return None
+    if path.startswith(prefix):
+        return path[len(prefix):]
+    return path
+
+def _parse_git_header(rest):
+    """
+    Split the 'a/<old> b/<new>' part of a 'diff --git' line into its two paths.
+    """
+    if rest.startswith('"'):
+        end = rest.index('"', 1)
+        while rest[end - 1] == '\\':
+            end = rest.index('"', end + 1)
+        return _strip_prefix(rest[:end + 1], 'a/'), _strip_prefix(rest[end + 2:], 'b/')
+    # Unquoted paths can contain spaces; when old and new paths match, the line is exactly 'a/P b/P'
+    length = (len(rest) - 5) // 2
+    if rest.startswith('a/') and rest[2 + length:5 + length] == ' b/' and rest[2:2 + length] == rest[5 + length:]:
+        return rest[2:2 + length], rest[5 + length:]
+    old_path, _, new_path = rest.partition(' b/')
+    return _strip_prefix(old_path, 'a/'), new_path
+
+def _new_file_record(old_path, new_path):
+    return {
+        'path': new_path or old_path,
+        'old_path': old_path,
+        'new_path': new_path,
+        'status': 'modified',
+        'is_binary': False,
+        'old_mode': None,
+        'new_mode': None,
+        'hunks': [],
+        'lines_added': [],
+        'lines_removed': [],
+    }
+
+def _finish_file_record(record):
+    if record['status'] == 'modified' and record['old_path'] and record['new_path'] and record['old_path'] != record['new_path']:
+        record['status'] = 'renamed'
+    record['path'] = record['new_path'] or record['old_path']
+    return record
+
+def parse_diff(source):
+    """
+    Stream a unified git diff and yield one record per changed file.
+    Each record is a dict with the file's 'path' (the new path, or the old path for deleted files), 'old_path',
+    'new_path', 'status' (added, deleted, renamed, copied or modified), 'is_binary', the 'old_mode'/'new_mode', the
+    'lines_added'/'lines_removed' of the whole file, and a list of 'hunks'. Each hunk holds its '@@' header, the
+    old/new start lines and lengths, the trailing 'section' text (usually the enclosing function) and its 'lines'
+    as [tag, old_line_number, new_line_number, text] where tag is ' ', '+' or '-'.
+    Only the file currently being parsed is held in memory, so multi-megabyte diffs can be consumed file by file.
+    Example of a record:
+    {'path': 'main.py', 'old_path': 'main.py', 'new_path': 'main.py', 'status': 'modified', 'is_binary': False,
+     'old_mode': None, 'new_mode': None, 'lines_added': ["print('Hi')"], 'lines_removed': ["print('Bye')"],
+     'hunks': [{'header': '@@ -1 +1 @@', 'old_start': 1, 'old_lines': 1, 'new_start': 1, 'new_lines': 1,
+                'section': '', 'lines': [['-', 1, None, "print('Bye')"], ['+', None, 1, "print('Hi')"]]}]}
+    """
+    record = None
+    hunk = None
+    old_remaining = new_remaining = 0
+    old_line = new_line = 0
+
+    for line in iter_diff_lines(source):
+        # Lines inside a hunk are content, even when they look like headers (e.g. a removed '-- comment' line)
+        if hunk is not None and (old_remaining > 0 or new_remaining > 0):
+            tag = line[:1] or ' '
+            text = line[1:]
+            if tag == '+':
+                hunk['lines'].append(['+', None, new_line, text])
+                record['lines_added'].append(text)
+                new_line += 1
+                new_remaining -= 1
+                continue
+            if tag == '-':
+                hunk['lines'].append(['-', old_line, None, text])
+                record['lines_removed'].append(text)
+                old_line += 1
+                old_remaining -= 1
+                continue
+            if tag == ' ':
+                hunk['lines'].append([' ', old_line, new_line, text])
+                old_line += 1
+                new_line += 1
+                old_remaining -= 1
+                new_remaining -= 1
+                continue
+            if tag == '\\':
+                # '\ No newline at end of file'
+                continue
+            # Anything else means the hunk was shorter than its header claimed; fall through to header parsing
+            hunk = None
+
+        if line.startswith('\\') and hunk is not None:
+            continue
+
+        if line.startswith('diff --git '):
+            if record is not None:
+                yield _finish_file_record(record)
+            old_path, new_path = _parse_git_header(line[len('diff --git '):])
+            record = _new_file_record(old_path, new_path)
+            hunk = None
+        elif record is None:
+            # Ignore any preamble before the first file header
+            continue
+        elif line.startswith('@@'):
+            match = HUNK_HEADER_RE.match(line)
+            if not match:
+                continue
+            old_start, old_lines, new_start, new_lines, section = match.groups()
+            hunk = {
+                'header': line,
+                'old_start': int(old_start),
+                'old_lines': int(old_lines) if old_lines is not None else 1,
+                'new_start': int(new_start),
+                'new_lines': int(new_lines) if new_lines is not None else 1,
+                'section': section.strip(),
+                'lines': [],
+            }
+            record['hunks'].append(hunk)
+            old_line, new_line = hunk['old_start'], hunk['new_start']
+            old_remaining, new_remaining = hunk['old_lines'], hunk['new_lines']
+        elif line.startswith('--- '):
+            record['old_path'] = _strip_prefix(line[4:].split('\t')[0], 'a/')
+        elif line.startswith('+++ '):
+            record['new_path'] = _strip_prefix(line[4:].split('\t')[0], 'b/')
+        elif line.startswith('new file mode '):
+            record['status'] = 'added'
+            record['new_mode'] = line[len('new file mode '):]
+            record['old_path'] = None
+        elif line.startswith('deleted file mode '):
+            record['status'] = 'deleted'
+            record['old_mode'] = line[len('deleted file mode '):]
+            record['new_path'] = None
+        elif line.startswith('old mode '):
+            record['old_mode'] = line[len('old mode '):]
+        elif line.startswith('new mode '):
+            record['new_mode'] = line[len('new mode '):]
+        elif line.startswith('rename from ') or line.startswith('copy from '):
+            record['old_path'] = _unquote(line.split(' from ', 1)[1])
+            record['status'] = 'renamed' if line.startswith('rename') else 'copied'
+        elif line.startswith('rename to ') or line.startswith('copy to '):
+            record['new_path'] = _unquote(line.split(' to ', 1)[1])
+        elif line.startswith('Binary files ') or line.startswith('GIT binary patch'):
+            record['is_binary'] = True
+
+    if record is not None:
+        yield _finish_file_record(record)
+
+def summarize_file(record):
+    """
+    Return a copy of a parsed file record suitable for JSON responses, with the file's added/removed line counts in place of the full line lists.
+    """
+    summary = dict(record)
+    summary['additions'] = len(record['lines_added'])
+    summary['deletions'] = len(record['lines_removed'])
+    summary.pop('lines_added', None)
+    summary.pop('lines_removed', None)
+    return summary
@@ -0,0 +1,152 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables from the .env file
+load_dotenv()
+
+class FileContentCache:
+    """
+    Content-addressed cache for file contents of the target branch.
+    Entries are keyed by the resolved commit hash plus the file path, never by a branch name, so a cached entry can
+    never go stale. A small in-memory LRU sits in front of an on-disk store, and both are bounded by size.
+    """
+
+    def __init__(self, cache_dir=None, max_disk_bytes=None, max_memory_bytes=None):
+        self.cache_dir = cache_dir or os.getenv("FILE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pr-reviewer-file-cache"))
+        self.max_disk_bytes = max_disk_bytes or int(os.getenv("FILE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+        self.max_memory_bytes = max_memory_bytes or int(os.getenv("FILE_CACHE_MEMORY_BYTES", 32 * 1024 * 1024))
+
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(commit_hash, path):
+        if not commit_hash:
+            raise ValueError("A resolved commit hash is required to cache file contents")
+        return hashlib.sha256(f"{commit_hash}:{path}".encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, commit_hash, path):
+        """
+        Return the cached contents for path at commit_hash, or None on a miss.
+        """
+        key = self.make_key(commit_hash, path)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        disk_path = self._disk_path(key)
+        try:
+            with open(disk_path, 'r', encoding='utf-8') as file:
+                contents = file.read()
+            # Touch the entry so disk eviction removes the least recently used files first
+            os.utime(disk_path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.error(f"Error reading file cache entry for '{path}': {e}")
+            return None
+
+        self._remember(key, contents)
+        return contents
+
+    def set(self, commit_hash, path, contents):
+        """
+        Store contents for path at commit_hash in memory and on disk.
+        """
+        if contents is None:
+            return
+        key = self.make_key(commit_hash, path)
+        self._remember(key, contents)
+
+        disk_path = self._disk_path(key)
+        data = contents.encode('utf-8')
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(disk_path))
+            with os.fdopen(fd, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, disk_path)
+        except OSError as e:
+            logging.error(f"Error writing file cache entry for '{path}': {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _remember(self, key, contents):
+        size = len(contents)
+        if size > self.max_memory_bytes:
+            return
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return
+            self._memory[key] = contents
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_memory_bytes:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _iter_disk_entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                full_path = os.path.join(root, name)
+                try:
+                    stat = os.stat(full_path)
+                except OSError:
+                    continue
+                yield full_path, stat
+
+    def _scan_disk_bytes(self):
+        return sum(stat.st_size for _, stat in self._iter_disk_entries())
+
+    def _evict_disk(self):
+        """
+        Remove the least recently used entries until the store is back under 80% of its size limit.
+        """
+        entries = sorted(self._iter_disk_entries(), key=lambda entry: entry[1].st_mtime)
+        total = sum(stat.st_size for _, stat in entries)
+        target = self.max_disk_bytes * 0.8
+        removed = 0
+        for full_path, stat in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(full_path)
+                total -= stat.st_size
+                removed += 1
+            except OSError:
+                continue
+        self._disk_bytes = total
+        logging.info(f"Evicted {removed} file cache entries, {total} bytes remaining")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_file_cache():
+    """
+    Return the process-wide file content cache, creating it on first use.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FileContentCache()
+    return _cache
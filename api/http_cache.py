@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+from flask import request, make_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Conditional GETs and response compression for the PR read endpoints. ETags are computed from a few small columns
+# before the large ones are loaded, so an unchanged PR is answered with a 304 without reading its diff or feedback.
+
+# Smaller bodies aren't worth compressing
+MIN_COMPRESS_BYTES = 500
+
+def make_etag(*parts):
+    return hashlib.sha256("|".join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+
+def not_modified(etag, last_modified=None):
+    """
+    Return a 304 response if the request's If-None-Match matches etag, otherwise None.
+    A compressed response carries the ETag with an encoding suffix, so those forms match too.
+    """
+    if not any(request.if_none_match.contains(tag) for tag in (etag, f"{etag}-gzip", f"{etag}-br")):
+        return None
+    response = make_response('', 304)
+    return add_validators(response, etag, last_modified)
+
+def add_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Let browsers keep the response but always revalidate it
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def compress_response(response):
+    """
+    after_request hook: compress JSON responses with brotli (when installed) or gzip, as accepted by the client.
+    Streamed responses such as the chat SSE endpoint are left alone.
+    """
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype != 'application/json'):
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_BYTES:
+        return response
+    accepted = request.accept_encodings
+    if brotli and accepted['br'] and accepted['br'] >= accepted['gzip']:
+        encoding, data = 'br', brotli.compress(data)
+    elif accepted['gzip']:
+        encoding, data = 'gzip', gzip.compress(data, compresslevel=6)
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
@@ -1,4 +1,5 @@
 import os
+import threading
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -11,7 +12,11 @@ load_dotenv()
 db = SQLAlchemy()
 migrate = Migrate()
 
-def create_app():
+def create_app(config=None):
+    """
+    Create the Flask app. config is applied on top of the settings read from the environment, e.g. by the
+    benchmark scripts to point the app at a scratch database.
+    """
     app = Flask(__name__)
     CORS(app)
 
@@ -33,6 +38,8 @@ def create_app():
     # Configure SQLAlchemy with the constructed database URL
     app.config['SQLALCHEMY_DATABASE_URI'] = database_url
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if config:
+        app.config.update(config)
 
     db.init_app(app)
     
@@ -40,9 +47,35 @@ def create_app():
     migrations_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
     migrate.init_app(app, db, directory=migrations_dir)
 
+    # Share rate limit state through the database when RATE_LIMIT_BACKEND=db
+    from .rate_limit import configure_rate_limits
+    configure_rate_limits(app, db)
+
+    # Read the prompt templates once at startup
+    from .llm import prompts
+    prompts.preload(['prompttext', 'groqPrompt', 'chatSummaryPrompt'])
+
     from .routes import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
+    # Background workers that drain the review_job table. Off by default: on Vercel the process is frozen once a
+    # response is sent (the queue is drained by the /api/jobs/drain cron instead), and CLI commands such as
+    # `flask db upgrade` shouldn't start workers. Long-running hosts enable them or run `flask review-worker`.
+    from .jobs import start_workers, worker_loop
+    if os.getenv("REVIEW_WORKERS_AUTOSTART", "false").lower() == "true":
+        start_workers(app)
+
+    @app.cli.command('review-worker')
+    def review_worker():
+        """Run a foreground review worker that drains queued review jobs."""
+        worker_loop(app, threading.Event())
+
+    @app.cli.command('backfill')
+    def backfill():
+        """Import and review every PR after the stored backfill checkpoint."""
+        from .backfill import run_backfill
+        run_backfill(app)
+
     app.wsgi_app = ProxyFix(app.wsgi_app)
     return app
 
@@ -0,0 +1,286 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from pytz import utc
+from sqlalchemy import insert, update, or_, and_
+from .index import db
+from .models import PR, ReviewJob, WebhookDelivery, FileReview, PRFile
+from .utils import process_pr, ReviewSuperseded
+from .retrieval import index_pr
+
+# Review jobs are stored in the review_job table, so no external broker is needed and the queue works the same on
+# SQLite and PostgreSQL. The queue is drained in one of two ways:
+#   - on serverless hosts (Vercel), where nothing runs after a response is sent, by a cron request to
+#     /api/jobs/drain that runs jobs with drain_jobs until the queue is empty or the invocation's time is used up;
+#   - on long-running hosts, by `flask review-worker` processes or by worker threads in the web process
+#     (REVIEW_WORKERS_AUTOSTART=true, see start_workers).
+
+def record_delivery(delivery_id, pr_id=None):
+    """
+    Record a webhook delivery ID in the current session. Returns False if the delivery was already seen, so
+    Bitbucket's redeliveries of the same event are acknowledged without being processed twice.
+    """
+    if not delivery_id:
+        return True
+    if db.session.get(WebhookDelivery, delivery_id) is not None:
+        return False
+    cutoff = datetime.now(utc) - timedelta(days=int(os.getenv("WEBHOOK_DELIVERY_TTL_DAYS", 7)))
+    WebhookDelivery.query.filter(WebhookDelivery.created_date < cutoff).delete(synchronize_session=False)
+    db.session.add(WebhookDelivery(delivery_id=delivery_id, pr_id=pr_id))
+    return True
+
+def enqueue_review(pr_id, target_branch, commit_hash):
+    """
+    Add a review job for the PR to the current session. The caller commits it together with the PR row.
+    Jobs are debounced: a new job only becomes claimable REVIEW_DEBOUNCE_SECONDS after the latest update, and a
+    job still waiting in the queue is moved to the newest commit instead of adding another one, so a burst of
+    pushes results in a single review of the latest source commit.
+    If a job for the same commit is already queued or running, that job is returned instead.
+    """
+    existing_job = ReviewJob.query.filter(
+        ReviewJob.pr_id == pr_id,
+        ReviewJob.commitHash == commit_hash,
+        ReviewJob.status.in_(['queued', 'running'])
+    ).first()
+    if existing_job:
+        return existing_job
+
+    run_after = datetime.now(utc) + timedelta(seconds=float(os.getenv("REVIEW_DEBOUNCE_SECONDS", 10)))
+    queued_job = ReviewJob.query.filter_by(pr_id=pr_id, status='queued').order_by(ReviewJob.id.desc()).first()
+    if queued_job:
+        logging.info(f"Coalescing review of PR {pr_id}: {queued_job.commitHash} -> {commit_hash}")
+        queued_job.commitHash = commit_hash
+        queued_job.targetBranchName = target_branch
+        queued_job.run_after = run_after
+        return queued_job
+
+    job = ReviewJob(pr_id=pr_id, targetBranchName=target_branch, commitHash=commit_hash, status='queued', attempts=0,
+                    run_after=run_after)
+    db.session.add(job)
+    return job
+
+def enqueue_new_reviews(prs):
+    """
+    Queue review jobs for PRs that have just been inserted, as one bulk insert in the current session.
+    prs is a list of dicts with 'pr_id', 'targetBranchName' and 'lastCommitHash'.
+    """
+    if not prs:
+        return
+    db.session.execute(insert(ReviewJob), [{
+        'pr_id': pr['pr_id'],
+        'targetBranchName': pr['targetBranchName'],
+        'commitHash': pr['lastCommitHash'],
+        'status': 'queued',
+        'attempts': 0,
+    } for pr in prs])
+
+def is_superseded(job):
+    """
+    A job is superseded once a newer job has been queued for the same PR, i.e. a later commit was pushed.
+    """
+    newer_job = db.session.query(ReviewJob.id).filter(
+        ReviewJob.pr_id == job.pr_id,
+        ReviewJob.id > job.id,
+        ReviewJob.status != 'failed'
+    ).first()
+    return newer_job is not None
+
+def latest_job_status(pr_id):
+    """
+    Return the status of the most recent review job for the PR, or None if it was never queued.
+    """
+    job = ReviewJob.query.filter_by(pr_id=pr_id).order_by(ReviewJob.id.desc()).first()
+    return job.status if job else None
+
+def serialize_job(job):
+    return {
+        'id': job.id,
+        'pr_id': job.pr_id,
+        'commitHash': job.commitHash,
+        'status': job.status,
+        'attempts': job.attempts,
+        'error': job.error,
+        'promptTokens': job.promptTokens,
+        'tokensSaved': job.tokensSaved,
+        'created_date': job.created_date.isoformat() if job.created_date else None,
+        'run_after': job.run_after.isoformat() if job.run_after else None,
+        'started_date': job.started_date.isoformat() if job.started_date else None,
+        'finished_date': job.finished_date.isoformat() if job.finished_date else None,
+    }
+
+def incremental_reviews_enabled():
+    return os.getenv("REVIEW_INCREMENTAL", "true").lower() == "true"
+
+def load_file_reviews(pr_id):
+    """
+    The per-file review state of the PR's last review, as expected by utils.review_files_incrementally.
+    """
+    return {review.path: {
+        'diffHash': review.diffHash,
+        'reviewVersion': review.reviewVersion,
+        'feedback': review.feedback,
+        'commitHash': review.commitHash,
+    } for review in FileReview.query.filter_by(pr_id=pr_id).all()}
+
+def store_file_reviews(pr_id, commit_hash, file_reviews):
+    """
+    Replace the PR's per-file review state in the current session. Files reviewed again are recorded at
+    commit_hash; files whose review was kept keep the commit they were reviewed at.
+    """
+    FileReview.query.filter_by(pr_id=pr_id).delete(synchronize_session=False)
+    if not file_reviews:
+        return
+    db.session.execute(insert(FileReview), [{
+        'pr_id': pr_id,
+        'path': path,
+        'commitHash': commit_hash if state.get('reviewed') else state.get('commitHash'),
+        'diffHash': state['diffHash'],
+        'reviewVersion': state['reviewVersion'],
+        'feedback': state['feedback'],
+    } for path, state in file_reviews.items()])
+
+def store_pr_files(pr_id, commit_hash, pr_files):
+    """
+    Replace the PR's per-file rows (see utils.pr_file_records) in the current session.
+    """
+    PRFile.query.filter_by(pr_id=pr_id).delete(synchronize_session=False)
+    if not pr_files:
+        return
+    db.session.execute(insert(PRFile), [dict(record, pr_id=pr_id, commitHash=commit_hash) for record in pr_files])
+
+def claim_next_job():
+    """
+    Atomically claim the oldest queued job whose debounce window has passed. Jobs left 'running' by a crashed
+    worker for longer than REVIEW_JOB_TIMEOUT seconds are claimed again.
+    The claim is a conditional UPDATE, so two workers (or two processes) can never claim the same job.
+    """
+    now = datetime.now(utc)
+    stale_before = now - timedelta(seconds=int(os.getenv("REVIEW_JOB_TIMEOUT", 900)))
+    claimable = or_(
+        and_(ReviewJob.status == 'queued', or_(ReviewJob.run_after.is_(None), ReviewJob.run_after <= now)),
+        and_(ReviewJob.status == 'running', ReviewJob.started_date < stale_before)
+    )
+
+    candidates = db.session.query(ReviewJob.id).filter(claimable).order_by(ReviewJob.id.asc()).limit(5).all()
+    for (job_id,) in candidates:
+        result = db.session.execute(
+            update(ReviewJob)
+            .where(ReviewJob.id == job_id, claimable)
+            .values(status='running', started_date=now, attempts=ReviewJob.attempts + 1)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return db.session.get(ReviewJob, job_id)
+    return None
+
+def run_job(job):
+    """
+    Review the PR for a claimed job and store the results on the PR row.
+    If a newer commit is queued for the PR while the job runs, the LLM call is skipped (or its result discarded)
+    and the job is marked 'superseded'. Failed jobs are queued again until REVIEW_JOB_MAX_ATTEMPTS is reached.
+    """
+    logging.info(f"Running review job {job.id} for PR {job.pr_id} at {job.commitHash}")
+    try:
+        stats = {}
+        pr_files = []
+        file_reviews = load_file_reviews(job.pr_id) if incremental_reviews_enabled() else None
+        raw_files_diff, processed_diff, feedback = process_pr(job.pr_id, job.targetBranchName,
+                                                              is_cancelled=lambda: is_superseded(job), stats=stats,
+                                                              file_reviews=file_reviews, pr_files=pr_files)
+        if is_superseded(job):
+            raise ReviewSuperseded(f"Review of {job.commitHash} superseded by a newer commit")
+        store_pr_files(job.pr_id, job.commitHash, pr_files)
+        if file_reviews is not None:
+            store_file_reviews(job.pr_id, job.commitHash, file_reviews)
+
+        pr_entry = db.session.get(PR, job.pr_id)
+        pr_entry.rawDiff = raw_files_diff
+        pr_entry.content = processed_diff
+        pr_entry.feedback = feedback
+        if not pr_entry.initialFeedback:
+            pr_entry.initialFeedback = feedback
+        pr_entry.lastCommitHash = job.commitHash
+        job.promptTokens = stats.get('prompt_tokens')
+        job.tokensSaved = stats.get('tokens_saved')
+        job.status = 'done'
+        job.error = None
+        job.finished_date = datetime.now(utc)
+        db.session.commit()
+        index_pr(job.pr_id, job.commitHash, raw_files_diff)
+    except ReviewSuperseded as e:
+        db.session.rollback()
+        logging.info(f"Discarding review job {job.id} for PR {job.pr_id}: {e}")
+        job = db.session.get(ReviewJob, job.id)
+        job.status = 'superseded'
+        job.finished_date = datetime.now(utc)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Review job {job.id} for PR {job.pr_id} failed: {e}")
+        job = db.session.get(ReviewJob, job.id)
+        job.error = str(e)
+        if job.attempts >= int(os.getenv("REVIEW_JOB_MAX_ATTEMPTS", 3)):
+            job.status = 'failed'
+            job.finished_date = datetime.now(utc)
+        else:
+            job.status = 'queued'
+        db.session.commit()
+
+def drain_jobs(time_budget=None, job_seconds=None):
+    """
+    Claim and run review jobs in the current app context until the queue is empty or the time budget is spent.
+    A new job is only claimed while at least job_seconds (the time one review is expected to take) are left, so
+    a serverless invocation returns before its time limit. Returns the number of jobs run.
+    """
+    time_budget = float(os.getenv("REVIEW_DRAIN_SECONDS", 50)) if time_budget is None else time_budget
+    job_seconds = float(os.getenv("REVIEW_DRAIN_JOB_SECONDS", 20)) if job_seconds is None else job_seconds
+    deadline = time.monotonic() + time_budget
+    jobs_run = 0
+    while deadline - time.monotonic() >= job_seconds:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        jobs_run += 1
+    return jobs_run
+
+def worker_loop(app, stop_event, poll_interval=None):
+    """
+    Claim and run review jobs until stop_event is set, sleeping for poll_interval seconds when the queue is empty.
+    """
+    poll_interval = poll_interval or float(os.getenv("REVIEW_POLL_INTERVAL", 2))
+    while not stop_event.is_set():
+        try:
+            with app.app_context():
+                job = claim_next_job()
+                if job is None:
+                    stop_event.wait(poll_interval)
+                    continue
+                run_job(job)
+        except Exception as e:
+            logging.error(f"Error in review worker: {e}")
+            stop_event.wait(poll_interval)
+
+_workers = []
+_stop_event = threading.Event()
+
+def start_workers(app, count=None):
+    """
+    Start the review worker pool in background threads. Calling it again is a no-op.
+    """
+    count = int(os.getenv("REVIEW_WORKERS", 2)) if count is None else count
+    if _workers or count <= 0:
+        return _workers
+    for i in range(count):
+        worker = threading.Thread(target=worker_loop, args=(app, _stop_event), name=f"review-worker-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+    logging.info(f"Started {count} review worker(s)")
+    return _workers
+
+def stop_workers(timeout=None):
+    _stop_event.set()
+    for worker in _workers:
+        worker.join(timeout)
@@ -0,0 +1,155 @@
+import os
+import hashlib
+import logging
+import threading
+import httpx
+from groq import Groq
+from .rate_limit import acquire_groq, call_with_backoff
+
+# Single entry point for Groq calls. The gateway keeps one Groq client (and so one pooled HTTP connection pool) for
+# the whole process, and prompt templates are read from disk once and then served from memory.
+
+PROMPT_DIR = os.path.dirname(__file__)
+
+class PromptStore:
+    """
+    Prompt templates loaded from files next to this module. Each template gets a version, the first 12 hex digits
+    of the sha256 of its text. With LLM_PROMPT_HOT_RELOAD=true a template is read again when its file's mtime
+    changes, so prompts can be edited without restarting the server.
+    """
+
+    def __init__(self, directory=PROMPT_DIR, hot_reload=None):
+        self.directory = directory
+        if hot_reload is None:
+            hot_reload = os.getenv("LLM_PROMPT_HOT_RELOAD", "false").lower() == "true"
+        self.hot_reload = hot_reload
+        self._prompts = {}  # name: (mtime, text, version)
+        self._lock = threading.Lock()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _load(self, name):
+        path = self._path(name)
+        mtime = os.path.getmtime(path)
+        with open(path, 'r') as file:
+            text = file.read().strip()
+        version = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+        self._prompts[name] = (mtime, text, version)
+        logging.info(f"Loaded prompt '{name}' version {version}")
+        return self._prompts[name]
+
+    def _entry(self, name):
+        entry = self._prompts.get(name)
+        if entry is not None and not self.hot_reload:
+            return entry
+        with self._lock:
+            entry = self._prompts.get(name)
+            if entry is None or os.path.getmtime(self._path(name)) != entry[0]:
+                entry = self._load(name)
+            return entry
+
+    def get(self, name):
+        """
+        Return the text of a prompt template. Raises FileNotFoundError if it doesn't exist.
+        """
+        return self._entry(name)[1]
+
+    def version(self, name):
+        return self._entry(name)[2]
+
+    def exists(self, name):
+        return name in self._prompts or os.path.exists(self._path(name))
+
+    def preload(self, names):
+        """
+        Load the given templates up front, logging instead of failing on missing files.
+        """
+        for name in names:
+            try:
+                self.get(name)
+            except OSError as e:
+                logging.error(f"Could not load prompt '{name}': {e}")
+
+class LLMGateway:
+    """
+    Long-lived Groq client shared by every thread. Each call draws from the shared Groq rate limits and is retried
+    with backoff when Groq throttles it; the SDK's own retries are turned off so there is a single retry policy.
+    """
+
+    def __init__(self, api_key=None, pool_size=None, timeout=None):
+        self.api_key = api_key
+        self.pool_size = pool_size or int(os.getenv("GROQ_POOL_SIZE", 10))
+        self.timeout = timeout or float(os.getenv("GROQ_TIMEOUT", 60))
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use, so the app can start before GROQ_API_KEY is configured
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    api_key = self.api_key or os.getenv("GROQ_API_KEY")
+                    if not api_key:
+                        raise ValueError("GROQ_API_KEY not set in environment variables")
+                    http_client = httpx.Client(
+                        timeout=self.timeout,
+                        limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+                    )
+                    self._client = Groq(api_key=api_key, max_retries=0, http_client=http_client)
+        return self._client
+
+    def _create(self, messages, model, stream, **params):
+        client = self.client
+
+        def create():
+            acquire_groq(messages, params.get('max_tokens'))
+            return client.chat.completions.create(messages=messages, model=model, stream=stream, **params)
+
+        return call_with_backoff('groq_requests', create)
+
+    def chat(self, messages, model, **params):
+        """
+        Send a chat completion and return the answer's text.
+        """
+        chat_completion = self._create(messages, model, False, **params)
+        return chat_completion.choices[0].message.content
+
+    def stream_chat(self, messages, model, **params):
+        """
+        Send a streaming chat completion. The request is made right away, so errors are raised here; the returned
+        ChatStream yields the answer's text as it arrives.
+        """
+        return ChatStream(self._create(messages, model, True, **params))
+
+class ChatStream:
+    """
+    Iterates over the text deltas of a streaming chat completion. close() drops the connection to Groq.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __iter__(self):
+        for chunk in self.stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def close(self):
+        self.stream.response.close()
+
+prompts = PromptStore()
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_llm_gateway():
+    """
+    Return the process-wide LLM gateway, creating it on first use.
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
@@ -1,6 +1,9 @@
 from datetime import datetime
+from pytz import utc
 from sqlalchemy.sql import func
+from sqlalchemy.orm import deferred
 from .index import db
+from .compression import CompressedText
 
 class PR(db.Model):
     __tablename__ = 'PR'
@@ -10,12 +13,19 @@ class PR(db.Model):
     sourceBranchName = db.Column(db.String, nullable=False)
     targetBranchName = db.Column(db.String, nullable=False)
     lastCommitHash = db.Column(db.String, nullable=True)
-    rawDiff = db.Column(db.Text, nullable=True)
-    content = db.Column(db.Text, nullable=True)
-    initialFeedback = db.Column(db.Text, nullable=True)
-    feedback = db.Column(db.Text, nullable=True)
+    # Large fields are stored compressed and only loaded (all four in one query) when one of them is accessed
+    rawDiff = deferred(db.Column(CompressedText, nullable=True), group='payload')
+    content = deferred(db.Column(CompressedText, nullable=True), group='payload')
+    initialFeedback = deferred(db.Column(CompressedText, nullable=True), group='payload')
+    feedback = deferred(db.Column(CompressedText, nullable=True), group='payload')
     created_date = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
-    last_modified = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Set in Python rather than by the database: SQLite's CURRENT_TIMESTAMP has no fractional seconds, and its text
+    # would not compare correctly with the timestamps SQLAlchemy writes, which breaks the /api/summary keyset
+    last_modified = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(utc), server_default=func.now(),
+                              onupdate=lambda: datetime.now(utc), nullable=False)
+
+    # /api/summary pages through PRs ordered by (last_modified, pr_id)
+    __table_args__ = (db.Index('ix_PR_last_modified_pr_id', 'last_modified', 'pr_id'),)
 
     def __repr__(self):
         return f'<PR {self.pr_id}>'
@@ -29,5 +39,127 @@ class Conversation(db.Model):
     role = db.Column(db.String, nullable=False)
     pr = db.relationship('PR', backref=db.backref('convo', lazy=True))
 
+    # Conversations are always read for one PR in date order
+    __table_args__ = (db.Index('ix_convo_pr_id_date_created', 'pr_id', 'date_created'),)
+
+    def __repr__(self):
+        return f'<Conversation {self.id} on PR {self.pr_id}>'
+
+class ReviewJob(db.Model):
+    __tablename__ = 'review_job'
+    id = db.Column(db.Integer, primary_key=True)
+    pr_id = db.Column(db.String, db.ForeignKey('PR.pr_id'), nullable=False, index=True)
+    commitHash = db.Column(db.String, nullable=True)
+    targetBranchName = db.Column(db.String, nullable=False)
+    status = db.Column(db.String, nullable=False, default='queued', index=True)  # queued, running, done, failed, superseded
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, nullable=True)
+    promptTokens = db.Column(db.Integer, nullable=True)  # Estimated tokens of the processed diff sent for review
+    tokensSaved = db.Column(db.Integer, nullable=True)  # Estimated tokens saved by hunk context over full files
+    created_date = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    run_after = db.Column(db.DateTime(timezone=True), nullable=True)  # Debounce: not claimed before this time
+    started_date = db.Column(db.DateTime(timezone=True), nullable=True)
+    finished_date = db.Column(db.DateTime(timezone=True), nullable=True)
+    pr = db.relationship('PR', backref=db.backref('review_jobs', lazy=True))
+
+    def __repr__(self):
+        return f'<ReviewJob {self.id} on PR {self.pr_id} ({self.status})>'
+
+
+class WebhookDelivery(db.Model):
+    __tablename__ = 'webhook_delivery'
+    delivery_id = db.Column(db.String, primary_key=True)
+    pr_id = db.Column(db.String, nullable=True)
+    created_date = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<WebhookDelivery {self.delivery_id}>'
+
+
+class ReviewCache(db.Model):
+    __tablename__ = 'review_cache'
+    cache_key = db.Column(db.String(64), primary_key=True)  # sha256 of the messages, model and sampling parameters
+    model = db.Column(db.String, nullable=False)
+    feedback = db.Column(db.Text, nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_date = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_used = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<ReviewCache {self.cache_key[:12]} ({self.model})>'
+
+
+class SyncState(db.Model):
+    __tablename__ = 'sync_state'
+    key = db.Column(db.String, primary_key=True)
+    value = db.Column(db.Text, nullable=True)
+    last_modified = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f'<SyncState {self.key}={self.value}>'
+
+
+class RateLimitBucket(db.Model):
+    __tablename__ = 'rate_limit_bucket'
+    name = db.Column(db.String, primary_key=True)  # groq_requests, groq_tokens, bitbucket_requests
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix time of the last refill
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.name}={self.tokens:.1f}>'
+
+
+class ConversationMemory(db.Model):
+    __tablename__ = 'conversation_memory'
+    pr_id = db.Column(db.String, db.ForeignKey('PR.pr_id'), primary_key=True)
+    summary = db.Column(db.Text, nullable=True)  # Rolling summary of the turns up to summarized_until_id
+    summarized_until_id = db.Column(db.Integer, nullable=False, default=0)  # Last convo id folded into the summary
+    last_modified = db.Column(db.DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    def __repr__(self):
+        return f'<ConversationMemory {self.pr_id} until {self.summarized_until_id}>'
+
+
+class FileReview(db.Model):
+    __tablename__ = 'file_review'
+    id = db.Column(db.Integer, primary_key=True)
+    pr_id = db.Column(db.String, db.ForeignKey('PR.pr_id'), nullable=False, index=True)
+    path = db.Column(db.String, nullable=False)
+    commitHash = db.Column(db.String, nullable=True)  # Source commit the file was last reviewed at
+    diffHash = db.Column(db.String(64), nullable=False)  # sha256 of the file's hunk lines, see utils.file_diff_hash
+    reviewVersion = db.Column(db.String, nullable=False)  # Model and review prompt version that produced the feedback
+    feedback = db.Column(db.Text, nullable=True)
+    created_date = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    pr = db.relationship('PR', backref=db.backref('file_reviews', lazy=True))
+
+    __table_args__ = (db.UniqueConstraint('pr_id', 'path', name='uq_file_review_pr_id_path'),)
+
+    def __repr__(self):
+        return f'<FileReview {self.path} on PR {self.pr_id}>'
+
+
+class PRFile(db.Model):
+    __tablename__ = 'pr_file'
+    id = db.Column(db.Integer, primary_key=True)
+    pr_id = db.Column(db.String, db.ForeignKey('PR.pr_id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False)  # Order of the file in the PR diff
+    path = db.Column(db.String, nullable=False)
+    oldPath = db.Column(db.String, nullable=True)
+    status = db.Column(db.String, nullable=False)  # added, deleted, renamed, copied or modified
+    isBinary = db.Column(db.Boolean, nullable=False, default=False)
+    commitHash = db.Column(db.String, nullable=True)  # Source commit the file was processed at
+    contentHash = db.Column(db.String(64), nullable=False)  # sha256 of the file's hunk lines, see utils.file_diff_hash
+    hunkCount = db.Column(db.Integer, nullable=False, default=0)
+    linesAdded = db.Column(db.Integer, nullable=False, default=0)
+    linesRemoved = db.Column(db.Integer, nullable=False, default=0)
+    promptTokens = db.Column(db.Integer, nullable=True)  # Estimated tokens of the file's processed contents
+    # The file's parsed hunks as JSON and its processed contents, only loaded when one file is requested
+    hunks = deferred(db.Column(CompressedText, nullable=True), group='payload')
+    content = deferred(db.Column(CompressedText, nullable=True), group='payload')
+    created_date = db.Column(db.DateTime(timezone=True), server_default=func.now(), nullable=False)
+    pr = db.relationship('PR', backref=db.backref('files', lazy=True))
+
+    __table_args__ = (db.UniqueConstraint('pr_id', 'path', name='uq_pr_file_pr_id_path'),)
+
     def __repr__(self):
-        return f'<Conversation {self.id} on PR {self.pr_id}>'
\ No newline at end of file
+        return f'<PRFile {self.path} on PR {self.pr_id}>'
@@ -0,0 +1,255 @@
+import os
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import RateLimitBucket
+from .chunking import estimate_tokens
+
+# Shared rate limits for outbound APIs. Each budget is a token bucket that refills continuously. By default the
+# buckets live in this process and are shared by all worker threads; with RATE_LIMIT_BACKEND=db their state is kept
+# in the rate_limit_bucket table so several processes draw from the same budget.
+
+_engine = None
+
+class RateLimitMetrics:
+    """
+    Counters of how often and for how long calls were throttled, per budget.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def record(self, name, throttled_seconds=0.0, backoff=False, acquired=False):
+        with self._lock:
+            entry = self._metrics.setdefault(name, {'acquired': 0, 'throttled': 0, 'throttled_seconds': 0.0, 'backoffs': 0})
+            if acquired:
+                entry['acquired'] += 1
+            if throttled_seconds > 0:
+                entry['throttled'] += 1
+                entry['throttled_seconds'] += throttled_seconds
+            if backoff:
+                entry['backoffs'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: {**entry, 'throttled_seconds': round(entry['throttled_seconds'], 3)}
+                    for name, entry in self._metrics.items()}
+
+metrics = RateLimitMetrics()
+
+class TokenBucket:
+    """
+    A bucket holding up to capacity tokens that refills at capacity per period seconds.
+    acquire(amount) blocks until amount tokens are available and returns the seconds spent waiting.
+    """
+
+    def __init__(self, name, capacity, period=60.0):
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, amount):
+        """
+        Take amount tokens if available. Returns 0 on success, otherwise the seconds until they will be.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0
+            return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount=1):
+        # A request larger than the whole bucket can never fit, so it waits for a full bucket instead
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            wait = self._take(amount)
+            if not wait:
+                metrics.record(self.name, throttled_seconds=waited, acquired=True)
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+class DatabaseTokenBucket(TokenBucket):
+    """
+    A token bucket whose state is stored in the rate_limit_bucket table, so the budget is shared between processes.
+    Tokens are taken with a compare-and-swap UPDATE that only matches the row as it was read, so two processes
+    (even on SQLite, where SELECT ... FOR UPDATE is ignored) can never spend the same tokens. If the database is
+    unavailable the bucket falls back to its in-process state rather than letting calls through unlimited.
+    """
+
+    def __init__(self, name, capacity, period=60.0, engine=None):
+        super().__init__(name, capacity, period)
+        self.engine = engine
+        self._row_created = False
+        self._shared = True
+
+    def _create_row(self):
+        """
+        Insert the bucket row, full, unless another process already has.
+        """
+        values = {'name': self.name, 'tokens': self.capacity, 'updated_at': time.time()}
+        dialect = self.engine.dialect.name
+        try:
+            with self.engine.begin() as connection:
+                if dialect in ('postgresql', 'sqlite'):
+                    dialect_insert = postgresql_insert if dialect == 'postgresql' else sqlite_insert
+                    connection.execute(dialect_insert(RateLimitBucket).values(**values)
+                                       .on_conflict_do_nothing(index_elements=['name']))
+                elif connection.execute(select(RateLimitBucket.name)
+                                        .where(RateLimitBucket.name == self.name)).first() is None:
+                    connection.execute(insert(RateLimitBucket).values(**values))
+        except IntegrityError:
+            # Another process inserted the row first
+            pass
+        self._row_created = True
+
+    def _take_shared(self, amount):
+        while True:
+            if not self._row_created:
+                self._create_row()
+            now = time.time()
+            with self.engine.begin() as connection:
+                row = connection.execute(
+                    select(RateLimitBucket.tokens, RateLimitBucket.updated_at).where(RateLimitBucket.name == self.name)
+                ).first()
+                if row is None:
+                    self._row_created = False
+                    continue
+                tokens = min(self.capacity, row.tokens + max(0.0, now - row.updated_at) * self.rate)
+                if tokens < amount:
+                    return (amount - tokens) / self.rate
+                result = connection.execute(
+                    update(RateLimitBucket)
+                    .where(RateLimitBucket.name == self.name, RateLimitBucket.tokens == row.tokens,
+                           RateLimitBucket.updated_at == row.updated_at)
+                    .values(tokens=tokens - amount, updated_at=now)
+                )
+                if result.rowcount == 1:
+                    return 0
+            # The row was changed (or deleted) between the read and the update; read it again
+
+    def _take(self, amount):
+        try:
+            wait = self._take_shared(amount)
+        except Exception as e:
+            if self._shared:
+                logging.error(f"Rate limiter '{self.name}' database unavailable, limiting this process only: {e}")
+                self._shared = False
+            return super()._take(amount)
+        if not self._shared:
+            logging.info(f"Rate limiter '{self.name}' database available again")
+            self._shared = True
+        return wait
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+# name: (environment variable, default capacity, period in seconds)
+BUDGETS = {
+    'groq_requests': ("GROQ_REQUESTS_PER_MINUTE", 30, 60.0),
+    'groq_tokens': ("GROQ_TOKENS_PER_MINUTE", 30000, 60.0),
+    'bitbucket_requests': ("BITBUCKET_REQUESTS_PER_HOUR", 1000, 3600.0),
+}
+
+def configure_rate_limits(app, db):
+    """
+    Called from create_app. With RATE_LIMIT_BACKEND=db, remember the app's engine so buckets can share state
+    through the database from any thread.
+    """
+    global _engine
+    if os.getenv("RATE_LIMIT_BACKEND", "memory") == "db":
+        with app.app_context():
+            _engine = db.engine
+
+def get_bucket(name):
+    bucket = _buckets.get(name)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(name)
+            if bucket is None:
+                env_name, default, period = BUDGETS[name]
+                capacity = float(os.getenv(env_name, default))
+                if _engine is not None:
+                    bucket = DatabaseTokenBucket(name, capacity, period, engine=_engine)
+                else:
+                    bucket = TokenBucket(name, capacity, period)
+                _buckets[name] = bucket
+    return bucket
+
+def acquire(name, amount=1):
+    """
+    Block until amount units of the named budget are available.
+    """
+    return get_bucket(name).acquire(amount)
+
+def acquire_groq(messages, max_tokens):
+    """
+    Reserve one request and the estimated tokens of a chat completion from the Groq budgets. Groq counts prompt
+    and completion tokens, so the completion is estimated as max_tokens capped at GROQ_EXPECTED_COMPLETION_TOKENS.
+    """
+    prompt_tokens = sum(estimate_tokens(message.get('content')) for message in messages)
+    completion_tokens = min(max_tokens or 0, int(os.getenv("GROQ_EXPECTED_COMPLETION_TOKENS", 1024)))
+    return acquire('groq_requests') + acquire('groq_tokens', prompt_tokens + completion_tokens)
+
+def _retry_after_seconds(headers):
+    value = headers.get('Retry-After') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+def _throttled(result=None, error=None):
+    """
+    Return (True, retry_after) when a response or exception means the server throttled the call.
+    Works for requests responses and for the Groq SDK's APIStatusError.
+    """
+    source = result if error is None else getattr(error, 'response', None)
+    status_code = getattr(source, 'status_code', None) or getattr(error, 'status_code', None)
+    if status_code in (429, 503):
+        return True, _retry_after_seconds(getattr(source, 'headers', None))
+    return False, None
+
+def call_with_backoff(name, call, max_retries=None, base_delay=1.0, max_delay=60.0):
+    """
+    Run call() and retry it when it is throttled (HTTP 429/503, as a response or an exception), waiting for the
+    server's Retry-After when given and otherwise for a full-jitter exponential delay, so that workers throttled at
+    the same moment don't all retry together.
+    """
+    max_retries = int(os.getenv("RATE_LIMIT_MAX_RETRIES", 5)) if max_retries is None else max_retries
+    for attempt in range(max_retries + 1):
+        try:
+            result = call()
+            throttled, retry_after = _throttled(result=result)
+        except Exception as e:
+            throttled, retry_after = _throttled(error=e)
+            if not throttled or attempt == max_retries:
+                raise
+            result = None
+        if not throttled or attempt == max_retries:
+            return result
+
+        delay = retry_after if retry_after is not None else random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+        delay += random.uniform(0, base_delay)
+        logging.info(f"'{name}' throttled, retrying in {delay:.1f}s (attempt {attempt + 1} of {max_retries})")
+        metrics.record(name, throttled_seconds=delay, backoff=True)
+        time.sleep(delay)
+    return result
@@ -0,0 +1,131 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, OrderedDict
+from .diff_parser import parse_diff
+from .chunking import estimate_tokens
+
+# Retrieval over a PR's diff for chat follow-ups. The diff is split into one chunk per hunk (long hunks into
+# several) and indexed with BM25, in process and without any network dependency. Indexes are cached per PR and
+# commit; a miss is rebuilt from the stored raw diff.
+
+WORD_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+CAMEL_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+def tokenize(text):
+    """
+    Lowercased words of text. Identifiers are also split into their camelCase and snake_case parts, so a question
+    about 'file cache' matches get_file_cache and FileContentCache.
+    """
+    tokens = []
+    for word in WORD_RE.findall(text or ""):
+        tokens.append(word.lower())
+        parts = [part.lower() for piece in word.split('_') for part in CAMEL_RE.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+def diff_chunks(diff_text, max_lines=None):
+    """
+    Split a unified diff into chunks of at most max_lines hunk lines. Each chunk is a dict with the file 'path'
+    and its 'text': the path, the hunk header and the hunk's lines with their +/-/space prefixes.
+    """
+    max_lines = max_lines or int(os.getenv("CHAT_CHUNK_LINES", 60))
+    chunks = []
+    for record in parse_diff(diff_text or ""):
+        if not record['hunks']:
+            chunks.append({'path': record['path'], 'text': f"Path: {record['path']} ({record['status']})"})
+            continue
+        for hunk in record['hunks']:
+            lines = [tag + text for tag, _, _, text in hunk['lines']]
+            for start in range(0, max(len(lines), 1), max_lines):
+                text = "\n".join([f"Path: {record['path']}", hunk['header']] + lines[start:start + max_lines])
+                chunks.append({'path': record['path'], 'text': text})
+    return chunks
+
+class BM25Index:
+    """
+    Okapi BM25 over a list of chunks.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_counts = [Counter(tokenize(chunk['text'])) for chunk in chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+        document_frequency = Counter(term for counts in self.term_counts for term in counts)
+        total = len(chunks)
+        self.idf = {term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+                    for term, frequency in document_frequency.items()}
+
+    def search(self, query, k):
+        """
+        Return the indexes of the k best-scoring chunks for query, best first. Chunks with no matching term are
+        never returned.
+        """
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for index, counts in enumerate(self.term_counts):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.average_length or 1))
+            for term in terms:
+                frequency = counts.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            if score > 0:
+                scores.append((score, index))
+        scores.sort(key=lambda item: (-item[0], item[1]))
+        return [index for _, index in scores[:k]]
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+def index_pr(pr_id, commit_hash, diff_text):
+    """
+    Build and cache the index of a PR's diff. Called when a PR is processed, and on a cache miss.
+    """
+    index = BM25Index(diff_chunks(diff_text))
+    with _indexes_lock:
+        _indexes[(pr_id, commit_hash)] = index
+        _indexes.move_to_end((pr_id, commit_hash))
+        while len(_indexes) > int(os.getenv("RETRIEVAL_CACHE_PRS", 64)):
+            _indexes.popitem(last=False)
+    return index
+
+def get_pr_index(pr_id, commit_hash, diff_text):
+    with _indexes_lock:
+        index = _indexes.get((pr_id, commit_hash))
+        if index is not None:
+            _indexes.move_to_end((pr_id, commit_hash))
+            return index
+    return index_pr(pr_id, commit_hash, diff_text)
+
+def retrieve_context(pr_entry, question):
+    """
+    The PR context to send with a chat question. PRs whose processed contents fit in CHAT_CONTEXT_TOKENS are sent
+    whole. Larger ones are reduced to the list of changed files plus the CHAT_RETRIEVAL_TOP_K diff chunks most
+    relevant to the question that fit in the budget.
+    """
+    budget = int(os.getenv("CHAT_CONTEXT_TOKENS", 3000))
+    content = pr_entry.content or ""
+    if estimate_tokens(content) <= budget or not pr_entry.rawDiff:
+        return content
+
+    index = get_pr_index(pr_entry.pr_id, pr_entry.lastCommitHash, pr_entry.rawDiff)
+    paths = list(OrderedDict.fromkeys(chunk['path'] for chunk in index.chunks))
+    parts = ["Files changed: " + ", ".join(paths),
+             "Only the parts of the diff most relevant to the question are included below."]
+    used_tokens = sum(estimate_tokens(part) for part in parts)
+    # A question that matches nothing in particular (e.g. "summarise this PR") gets the diff from the top
+    matches = index.search(question, int(os.getenv("CHAT_RETRIEVAL_TOP_K", 5))) or range(len(index.chunks))
+    for chunk_index in matches:
+        text = index.chunks[chunk_index]['text']
+        tokens = estimate_tokens(text)
+        if used_tokens + tokens > budget:
+            continue
+        parts.append(text)
+        used_tokens += tokens
+    return "\n\n".join(parts)
@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from pytz import utc
+from sqlalchemy.exc import IntegrityError
+from .index import db
+from .models import ReviewCache
+
+# LLM reviews are cached in the review_cache table, keyed by a hash of everything that determines the completion:
+# the prompt and processed diff (as the exact chat messages), the model name and the sampling parameters.
+
+def review_cache_key(messages, model, params):
+    payload = json.dumps({'messages': messages, 'model': model, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def get_cached_review(cache_key):
+    """
+    Return the cached feedback for cache_key, or None on a miss. Entries older than REVIEW_CACHE_TTL_SECONDS are
+    treated as misses and removed.
+    """
+    try:
+        entry = db.session.get(ReviewCache, cache_key)
+        if entry is None:
+            return None
+
+        now = datetime.now(utc)
+        ttl = timedelta(seconds=int(os.getenv("REVIEW_CACHE_TTL_SECONDS", 7 * 24 * 3600)))
+        created_date = entry.created_date if entry.created_date.tzinfo else entry.created_date.replace(tzinfo=utc)
+        if created_date < now - ttl:
+            db.session.delete(entry)
+            db.session.commit()
+            return None
+
+        entry.hits += 1
+        entry.last_used = now
+        feedback = entry.feedback
+        db.session.commit()
+        return feedback
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error reading review cache: {e}")
+        return None
+
+def store_review(cache_key, model, feedback):
+    """
+    Store feedback under cache_key, then evict the least recently used entries beyond REVIEW_CACHE_MAX_ENTRIES.
+    A failure to cache never fails the review itself.
+    """
+    if not feedback:
+        return
+    try:
+        now = datetime.now(utc)
+        db.session.add(ReviewCache(cache_key=cache_key, model=model, feedback=feedback, hits=0, created_date=now, last_used=now))
+        db.session.commit()
+    except IntegrityError:
+        # Another worker cached the same review first
+        db.session.rollback()
+        return
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error writing review cache: {e}")
+        return
+
+    try:
+        max_entries = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", 1000))
+        cutoff = db.session.query(ReviewCache.last_used).order_by(ReviewCache.last_used.desc()).offset(max_entries).limit(1).scalar()
+        if cutoff is not None:
+            ReviewCache.query.filter(ReviewCache.last_used <= cutoff).delete(synchronize_session=False)
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error evicting review cache entries: {e}")
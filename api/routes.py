@@ -1,11 +1,22 @@
 from datetime import datetime
-from flask import Blueprint, request, jsonify
-from groq import Groq
-from .models import PR, Conversation
-from .utils import get_all_prs_from_repo, get_files_diff, process_files_diff, analyze_code_with_llm, queryLLM, handle_date, get_raw_files_diff, process_pr
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from groq import APIError
+from sqlalchemy import insert, update, select, func, or_, and_
+from sqlalchemy.orm import load_only, undefer, undefer_group
+from .models import PR, Conversation, ReviewJob, SyncState, PRFile, FileReview
+from .utils import get_all_prs_from_repo, handle_date, get_model_name
+from .diff_parser import parse_diff, summarize_file
+from .jobs import enqueue_review, enqueue_new_reviews, record_delivery, latest_job_status, serialize_job, drain_jobs
+from .rate_limit import metrics as rate_limit_metrics
+from .llm import get_llm_gateway, prompts
+from .chat_memory import build_chat_messages, schedule_memory_update
+from .retrieval import retrieve_context
+from .backfill import start_backfill, progress as backfill_progress, get_checkpoint as get_backfill_checkpoint
+from .http_cache import make_etag, not_modified, add_validators, compress_response
 from .index import db
 import os
-import requests
+import json
+import base64
 import logging
 from dotenv import load_dotenv
 
@@ -13,71 +24,110 @@ from dotenv import load_dotenv
 load_dotenv()
 
 main = Blueprint('main', __name__)
+main.after_request(compress_response)
 
+SYNC_WATERMARK_KEY = 'pr_sync_updated_on'
+
+# Incremental sync: only PRs updated since the stored high-water mark are fetched (pass ?full=true to resync
+# everything). Existing rows are loaded in one query and all changes are written as bulk upserts in a single
+# transaction. New PRs, and PRs with a new source commit, are queued for review by the background workers.
 @main.route('/api/sync_prs', methods=['POST'])
 def sync_all_prs():
     try:
-        pr_list = get_all_prs_from_repo()
+        full_sync = request.args.get('full', 'false').lower() == 'true'
+        watermark = db.session.get(SyncState, SYNC_WATERMARK_KEY)
+        updated_since = None if full_sync or watermark is None else watermark.value
+
+        pr_list = get_all_prs_from_repo(updated_since=updated_since)
         if 'values' not in pr_list:
             return jsonify({'status': 'error', 'message': 'No PRs found'}), 400
 
+        pr_ids = [str(pr_data.get('id')) for pr_data in pr_list['values']]
+        existing_commits = dict(
+            db.session.query(PR.pr_id, PR.lastCommitHash).filter(PR.pr_id.in_(pr_ids)).all()
+        ) if pr_ids else {}
+
+        updated_prs = []
+        new_prs = {}
+        new_reviews = {}
+        newest_update = None
         for pr_data in pr_list['values']:
             pr_id = str(pr_data.get('id'))  # Cast the PR ID to a string
-            title = pr_data.get('title', 'No Title')
-            status = pr_data.get('state')
-            source_branch = pr_data['source']['branch']['name']
-            target_branch = pr_data['destination']['branch']['name']
-            lastCommitHash = pr_data['source']['commit']['hash']
-            created_date = handle_date(pr_data.get('created_on'))
             last_modified = handle_date(pr_data.get('updated_on'))
+            newest_update = last_modified if newest_update is None else max(newest_update, last_modified)
+            row = {
+                'pr_id': pr_id,
+                'title': pr_data.get('title', 'No Title'),
+                'status': pr_data.get('state'),
+                'sourceBranchName': pr_data['source']['branch']['name'],
+                'targetBranchName': pr_data['destination']['branch']['name'],
+                'last_modified': last_modified,
+            }
+            commit_hash = pr_data['source']['commit']['hash']
 
-            # Check if the PR already exists in the database
-            existing_pr = PR.query.filter_by(pr_id=pr_id).first()
-            if existing_pr:
-                # Update existing PR with new information
-                existing_pr.title = title
-                existing_pr.status = status
-                existing_pr.sourceBranchName = source_branch
-                existing_pr.targetBranchName = target_branch
-                existing_pr.last_modified = last_modified
-                existing_pr.lastCommitHash = lastCommitHash
-                db.session.add(existing_pr)
+            if pr_id in existing_commits:
+                updated_prs.append(row)
+                if existing_commits[pr_id] != commit_hash:
+                    enqueue_review(pr_id, row['targetBranchName'], commit_hash)
             else:
-                # Process PR diff and feedback for new PRs
-                raw_files_diff = get_raw_files_diff(pr_id)
-                files_diff = get_files_diff(pr_id)
-                processed_diff = process_files_diff(files_diff)
-                prompt_file_path = os.path.join(os.path.dirname(__file__), 'prompttext')
-                with open(prompt_file_path, 'r') as file:
-                    prompt_text = file.read().strip()
-                feedback = analyze_code_with_llm(prompt_text, processed_diff)
-
-                # Insert new PR data
-                new_pr_diff = PR(
-                    pr_id=pr_id,
-                    title=title,
-                    status=status,
-                    sourceBranchName=source_branch,
-                    targetBranchName=target_branch,
-                    lastCommitHash=lastCommitHash,
-                    rawDiff = raw_files_diff,
-                    content=processed_diff,
-                    initialFeedback=feedback,
-                    feedback=feedback,
-                    created_date=created_date,
-                    last_modified=last_modified
-                )
-                db.session.add(new_pr_diff)
-
-            db.session.commit()
+                # Like handle_pr, lastCommitHash is only set once the review job succeeds, so a failed review is
+                # queued again by the next sync or webhook for the same commit
+                row['lastCommitHash'] = None
+                row['created_date'] = handle_date(pr_data.get('created_on'))
+                new_prs[pr_id] = row
+                new_reviews[pr_id] = dict(row, lastCommitHash=commit_hash)
+
+        if updated_prs:
+            db.session.execute(update(PR), updated_prs)
+        if new_prs:
+            db.session.execute(insert(PR), list(new_prs.values()))
+            enqueue_new_reviews(list(new_reviews.values()))
+        if newest_update is not None:
+            db.session.merge(SyncState(key=SYNC_WATERMARK_KEY, value=newest_update.isoformat()))
+        db.session.commit()
 
-        return jsonify({'status': 'success', 'message': 'All PRs synced and saved successfully'}), 200
+        logging.info(f"Synced PRs since {updated_since or 'the beginning'}: {len(updated_prs)} updated, {len(new_prs)} new")
+        return jsonify({
+            'status': 'success',
+            'message': 'All PRs synced and saved successfully',
+            'updated': len(updated_prs),
+            'new': len(new_prs),
+        }), 200
     except Exception as e:
         logging.error(f"Error syncing PRs: {e}")
         db.session.rollback()
         return jsonify({'error': 'Internal server error'}), 500
 
+# Full, resumable import of every PR in the repository. POST starts it in the background, GET reports progress.
+@main.route('/api/backfill', methods=['POST'])
+def start_backfill_run():
+    try:
+        started = start_backfill(current_app._get_current_object())
+        if not started:
+            return jsonify({'status': 'error', 'message': 'A backfill is already running'}), 409
+        return jsonify({'status': 'accepted', 'message': 'Backfill started'}), 202
+    except Exception as e:
+        logging.error(f"Error starting backfill: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route('/api/backfill', methods=['GET'])
+def backfill_status():
+    try:
+        status = backfill_progress.snapshot()
+        status['checkpoint'] = get_backfill_checkpoint()
+        return jsonify(status), 200
+    except Exception as e:
+        logging.error(f"Error fetching backfill status: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+# Time this process has spent waiting on the shared Groq and Bitbucket rate limits
+@main.route('/api/metrics/rate-limits', methods=['GET'])
+def rate_limit_status():
+    return jsonify(rate_limit_metrics.snapshot()), 200
+
 # Api to receive payload from Bitbucket webhook for new PRs or updates to the PR
+# The PR row is stored right away and the review itself is queued for the background workers, so the webhook
+# answers with 202 before Bitbucket times the delivery out.
 @main.route('/api/pr', methods=['POST'])
 def handle_pr():
     data = request.json
@@ -88,85 +138,168 @@ def handle_pr():
     pr_id = str(pr_data.get('id'))
     created_date = handle_date(pr_data.get('created_on'), to_sgt=True)
     updated_date = handle_date(pr_data.get('updated_on'), to_sgt=True)
+    commit_hash = pr_data['source']['commit']['hash']
 
-    # Update the PR entry if this pr_id already exists
-    pr_entry = PR.query.filter_by(pr_id=pr_id).first()
-    if pr_entry:
-        pr_entry.title = pr_data.get('title', 'No Title')
-        pr_entry.status = pr_data['state']
-        pr_entry.last_modified = updated_date
-        if pr_entry.lastCommitHash != pr_data['source']['commit']['hash']:
-            pr_entry.rawDiff, pr_entry.content, pr_entry.feedback = process_pr(pr_id, pr_entry.targetBranchName)
-            pr_entry.lastCommitHash = pr_data['source']['commit']['hash']
-        db.session.commit()
-        return jsonify({'status': 'success', 'message': 'Pull request status updated successfully'}), 200
-    else:
-        target_branch = pr_data['destination']['branch']['name']
-        logging.info(f"Processing PR: {pr_id}, Title: {pr_data.get('title', 'No Title')}, Status: {pr_data['state']}")
-        try:
-            raw_files_diff, processed_diff, feedback = process_pr(pr_id, target_branch)
-            # Insert the fetched PR data into the PostgreSQL database
-            new_pr_diff = PR(
+    try:
+        # Bitbucket retries deliveries it considers failed; each delivery carries a unique X-Request-UUID
+        if not record_delivery(request.headers.get('X-Request-UUID'), pr_id):
+            return jsonify({'status': 'success', 'message': 'Duplicate delivery ignored'}), 200
+
+        # Update the PR entry if this pr_id already exists
+        pr_entry = PR.query.filter_by(pr_id=pr_id).first()
+        if pr_entry:
+            pr_entry.title = pr_data.get('title', 'No Title')
+            pr_entry.status = pr_data['state']
+            pr_entry.last_modified = updated_date
+            job = None
+            if pr_entry.lastCommitHash != commit_hash:
+                job = enqueue_review(pr_id, pr_entry.targetBranchName, commit_hash)
+            db.session.commit()
+            if job is None:
+                return jsonify({'status': 'success', 'message': 'Pull request status updated successfully'}), 200
+            return jsonify({'status': 'accepted', 'message': 'Pull request review queued', 'job_id': job.id}), 202
+        else:
+            logging.info(f"Queueing PR: {pr_id}, Title: {pr_data.get('title', 'No Title')}, Status: {pr_data['state']}")
+            new_pr = PR(
                 pr_id=pr_id,
                 title=pr_data.get('title', 'No Title'),
                 status=pr_data['state'], 
                 sourceBranchName=pr_data['source']['branch']['name'],
                 targetBranchName=pr_data['destination']['branch']['name'],
-                lastCommitHash=pr_data['source']['commit']['hash'],
-                rawDiff = raw_files_diff,
-                content=processed_diff,
-                initialFeedback=feedback,
-                feedback=feedback,
                 created_date=created_date,
                 last_modified=updated_date
             )
-            db.session.add(new_pr_diff)
+            db.session.add(new_pr)
+            job = enqueue_review(pr_id, new_pr.targetBranchName, commit_hash)
             db.session.commit()
-            return jsonify({'status': 'success', 'message': 'Pull request processed and saved successfully'}), 200
-        except Exception as e:
-            logging.error(f"Error processing pull request: {e}")
-            db.session.rollback()
-            return jsonify({'error': 'Internal server error'}), 500
+            return jsonify({'status': 'accepted', 'message': 'Pull request saved and review queued', 'job_id': job.id}), 202
+    except Exception as e:
+        logging.error(f"Error processing pull request: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
 
+# Runs queued review jobs until the queue is empty or the invocation's time budget is used up. Called by the
+# Vercel cron in vercel.json, which sends CRON_SECRET as a bearer token when it is configured.
+@main.route('/api/jobs/drain', methods=['GET', 'POST'])
+def drain_review_jobs():
+    cron_secret = os.getenv("CRON_SECRET")
+    if cron_secret and request.headers.get('Authorization') != f"Bearer {cron_secret}":
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        jobs_run = drain_jobs()
+        queued = ReviewJob.query.filter_by(status='queued').count()
+        return jsonify({'status': 'success', 'jobs_run': jobs_run, 'queued': queued}), 200
+    except Exception as e:
+        logging.error(f"Error draining review jobs: {e}")
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route('/api/pr/<string:pr_id>/jobs', methods=['GET'])
+def get_review_jobs(pr_id):
+    try:
+        jobs = ReviewJob.query.filter_by(pr_id=pr_id).order_by(ReviewJob.id.desc()).all()
+        return jsonify({'jobs': [serialize_job(job) for job in jobs]}), 200
+    except Exception as e:
+        logging.error(f"Error fetching review jobs for PR {pr_id}: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+SUMMARY_COLUMNS = (PR.pr_id, PR.title, PR.status, PR.sourceBranchName, PR.targetBranchName, PR.lastCommitHash,
+                   PR.created_date, PR.last_modified)
+
+def encode_summary_cursor(entry):
+    cursor = json.dumps({'last_modified': entry.last_modified.isoformat(), 'pr_id': entry.pr_id})
+    return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+def decode_summary_cursor(cursor):
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return datetime.fromisoformat(data['last_modified']), str(data['pr_id'])
+
+# Dashboard list: only the list columns are loaded (the diff, contents and feedback columns stay deferred and are
+# served by the per-PR endpoints below). Pages are ordered by (last_modified, pr_id) descending and continued with
+# an opaque keyset cursor: pass the previous page's next_cursor as ?cursor= to get the next page.
 @main.route('/api/summary', methods=['GET'])
 def summary():
     try:
         numEntriesToDisplay = int(os.getenv("NUMENTRIESTODISPLAY", 15))  # Display 15 by default
-        
-        # Query the latest entries, ordered by date_created in descending order
-        latest_entries = PR.query.order_by(PR.last_modified.desc()).limit(numEntriesToDisplay).all()
-        
-        # Build the response while handling None values for date_created
-        entries = []
-        for entry in latest_entries:
-            entries.append({
-                'title': entry.title,
-                'status':entry.status,
-                'pr_id': entry.pr_id,
-                'sourceBranchName': entry.sourceBranchName,
-                'targetBranchName': entry.targetBranchName,
-                'lastCommitHash': entry.lastCommitHash,
-                'content': entry.content,
-                'initialFeedback': entry.initialFeedback,
-                'created_date': handle_date(entry.created_date, to_sgt=True, as_string=True),
-                'last_modified': handle_date(entry.last_modified, to_sgt=True, as_string=True)
-            })
-        # Log the entries for debugging purposes
-        logging.info(f"Entries: {entries}")
-        
-        return jsonify({'entries': entries}), 200
+        limit = min(max(request.args.get('limit', numEntriesToDisplay, type=int), 1), 100)
+
+        query = PR.query.options(load_only(*SUMMARY_COLUMNS))
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                last_modified, pr_id = decode_summary_cursor(cursor)
+            except (ValueError, KeyError, TypeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+            query = query.filter(or_(
+                PR.last_modified < last_modified,
+                and_(PR.last_modified == last_modified, PR.pr_id < pr_id)
+            ))
+
+        # One extra row tells us whether there is a next page
+        latest_entries = query.order_by(PR.last_modified.desc(), PR.pr_id.desc()).limit(limit + 1).all()
+        has_more = len(latest_entries) > limit
+        latest_entries = latest_entries[:limit]
+
+        entries = [{
+            'title': entry.title,
+            'status': entry.status,
+            'pr_id': entry.pr_id,
+            'sourceBranchName': entry.sourceBranchName,
+            'targetBranchName': entry.targetBranchName,
+            'lastCommitHash': entry.lastCommitHash,
+            'created_date': handle_date(entry.created_date, to_sgt=True, as_string=True),
+            'last_modified': handle_date(entry.last_modified, to_sgt=True, as_string=True)
+        } for entry in latest_entries]
+        next_cursor = encode_summary_cursor(latest_entries[-1]) if has_more else None
+
+        return jsonify({'entries': entries, 'next_cursor': next_cursor}), 200
     except Exception as e:
         logging.error(f"Error fetching summary: {e}")
         logging.error(f"Error type: {type(e).__name__}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def pr_cache_validators(pr_id, with_conversations=False, with_review_job=False):
+    """
+    Returns (etag, last_modified) for a PR's read endpoints, or None if the PR doesn't exist. The ETag is derived
+    from lastCommitHash and last_modified, plus the conversation count and the latest review job's status when the
+    response includes them, all in one query that leaves the large columns alone.
+    """
+    columns = [PR.lastCommitHash, PR.last_modified]
+    if with_conversations:
+        columns.append(select(func.count(Conversation.id)).where(Conversation.pr_id == PR.pr_id).scalar_subquery())
+    if with_review_job:
+        for column in (ReviewJob.id, ReviewJob.status):
+            latest_job = select(column).where(ReviewJob.pr_id == PR.pr_id).order_by(ReviewJob.id.desc()).limit(1)
+            columns.append(latest_job.scalar_subquery())
+    row = db.session.query(*columns).filter(PR.pr_id == pr_id).first()
+    if row is None:
+        return None
+    return make_etag(*row), handle_date(row.last_modified)
+
+# The PR read endpoints support conditional GETs: a request whose If-None-Match matches the current ETag gets a
+# 304 before the diff, contents or feedback are loaded.
+# ?slim=true leaves out rawDiff and content, which the detail page loads on demand (/raw-diff, /files, /content),
+# and reports how many per-file rows the PR has instead.
 @main.route('/api/pr/<string:pr_id>', methods=['GET'])
 def pr_entry(pr_id):
     if request.method == 'GET':
         try:
-            pr_entry = PR.query.filter_by(pr_id=pr_id).first()
-            if pr_entry is None:
+            slim = request.args.get('slim', 'false').lower() == 'true'
+            validators = pr_cache_validators(pr_id, with_conversations=True, with_review_job=True)
+            if validators is None:
                 return jsonify({'error': 'PR not found'}), 404
+            if slim:
+                # The slim and full responses are different representations, so they can't share an ETag
+                validators = (make_etag(validators[0], 'slim'), validators[1])
+            cached = not_modified(*validators)
+            if cached is not None:
+                return cached
+
+            if slim:
+                options = [undefer(PR.initialFeedback), undefer(PR.feedback)]
+            else:
+                options = [undefer_group('payload')]
+            pr_entry = PR.query.options(*options).filter_by(pr_id=pr_id).first()
 
             # Fetch conversation history (if needed)
             conversations = Conversation.query.filter_by(pr_id=pr_id).order_by(Conversation.date_created.asc()).all()
@@ -175,7 +308,6 @@ def pr_entry(pr_id):
                 'message': conv.message,
                 'date_created': conv.date_created.isoformat()
             } for conv in conversations]
-            logging.info(f"Rawdiff: {pr_entry.rawDiff}")
             pr_data = {
                 'pr_id': pr_entry.pr_id,
                 'title': pr_entry.title,
@@ -183,15 +315,19 @@ def pr_entry(pr_id):
                 'sourceBranchName': pr_entry.sourceBranchName,
                 'targetBranchName': pr_entry.targetBranchName,
                 'lastCommitHash': pr_entry.lastCommitHash,
-                'rawDiff' : pr_entry.rawDiff,
-                'content': pr_entry.content,
-                'initialFeedback': pr_entry.initialFeedback,
-                'feedback': pr_entry.feedback,
+                'initialFeedback': pr_entry.initialFeedback or '',
+                'feedback': pr_entry.feedback or '',
+                'reviewStatus': latest_job_status(pr_id),
                 'conversation_history': conversation_history,
                 'created_date': handle_date(pr_entry.created_date, to_sgt=True, as_string=True),
                 'last_modified': handle_date(pr_entry.last_modified, to_sgt=True, as_string=True)
             }
-            return jsonify(pr_data), 200
+            if slim:
+                pr_data['fileCount'] = db.session.query(func.count(PRFile.id)).filter(PRFile.pr_id == pr_id).scalar()
+            else:
+                pr_data['rawDiff'] = pr_entry.rawDiff or ''
+                pr_data['content'] = pr_entry.content or ''
+            return add_validators(jsonify(pr_data), *validators), 200
         except Exception as e:
             logging.error(f"Error fetching PR {pr_id}: {e}")
             return jsonify({'error': 'Internal server error'}), 500
@@ -241,27 +377,174 @@ def get_conversations(pr_id):
         logging.error(f"Error fetching conversations: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+def get_pr_column(pr_id, column):
+    """
+    Load a single column of a PR without loading the rest of the row. Returns (found, value).
+    """
+    row = db.session.query(column).filter(PR.pr_id == pr_id).first()
+    return (False, None) if row is None else (True, row[0])
+
 @main.route('/api/pr/<string:pr_id>/content', methods=['GET'])
 def get_content(pr_id):
+    try:
+        validators = pr_cache_validators(pr_id)
+        if validators is None:
+            return jsonify({'error': 'PR not found'}), 404
+        cached = not_modified(*validators)
+        if cached is not None:
+            return cached
+
+        found, content = get_pr_column(pr_id, PR.content)
+        if not found:
+            return jsonify({'error': 'PR not found'}), 404
+        return add_validators(jsonify({'contents': content}), *validators), 200
+    except Exception as e:
+        logging.error(f"Error fetching PR contents {pr_id}: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route('/api/pr/<string:pr_id>/raw-diff', methods=['GET'])
+def get_raw_diff(pr_id):
+    try:
+        validators = pr_cache_validators(pr_id)
+        if validators is None:
+            return jsonify({'error': 'PR not found'}), 404
+        cached = not_modified(*validators)
+        if cached is not None:
+            return cached
+
+        found, raw_diff = get_pr_column(pr_id, PR.rawDiff)
+        if not found:
+            return jsonify({'error': 'PR not found'}), 404
+        return add_validators(jsonify({'rawDiff': raw_diff or ''}), *validators), 200
+    except Exception as e:
+        logging.error(f"Error fetching PR diff {pr_id}: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route('/api/pr/<string:pr_id>/diff', methods=['GET'])
+def get_structured_diff(pr_id):
+    """
+    Returns the stored raw diff parsed into per-file/per-hunk records with line numbers.
+    """
     try:
         pr_entry = PR.query.filter_by(pr_id=pr_id).first()
         if pr_entry is None:
             return jsonify({'error': 'PR not found'}), 404
-        return jsonify({'contents': pr_entry.content}), 200
+        files = [summarize_file(record) for record in parse_diff(pr_entry.rawDiff or '')]
+        return jsonify({'files': files}), 200
     except Exception as e:
-        logging.error(f"Error fetching PR contents {pr_id}: {e}")
+        logging.error(f"Error parsing PR diff {pr_id}: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def serialize_pr_file(pr_file, has_review=False):
+    return {
+        'path': pr_file.path,
+        'oldPath': pr_file.oldPath,
+        'status': pr_file.status,
+        'isBinary': pr_file.isBinary,
+        'commitHash': pr_file.commitHash,
+        'contentHash': pr_file.contentHash,
+        'hunkCount': pr_file.hunkCount,
+        'linesAdded': pr_file.linesAdded,
+        'linesRemoved': pr_file.linesRemoved,
+        'promptTokens': pr_file.promptTokens,
+        'hasReview': has_review,
+    }
+
+# Per-file access to a PR, so the files of a large PR can be listed and then loaded one at a time. Files are
+# written by the review jobs; PRs not reviewed since the pr_file table was added have no files yet.
+@main.route('/api/pr/<string:pr_id>/files', methods=['GET'])
+def get_pr_files(pr_id):
+    try:
+        validators = pr_cache_validators(pr_id)
+        if validators is None:
+            return jsonify({'error': 'PR not found'}), 404
+        cached = not_modified(*validators)
+        if cached is not None:
+            return cached
+
+        pr_files = PRFile.query.filter_by(pr_id=pr_id).order_by(PRFile.position.asc()).all()
+        reviewed = {path for (path,) in db.session.query(FileReview.path).filter(
+            FileReview.pr_id == pr_id, FileReview.feedback.isnot(None))}
+        files = [serialize_pr_file(pr_file, pr_file.path in reviewed) for pr_file in pr_files]
+        return add_validators(jsonify({'files': files}), *validators), 200
+    except Exception as e:
+        logging.error(f"Error fetching PR files {pr_id}: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route('/api/pr/<string:pr_id>/files/<path:file_path>', methods=['GET'])
+def get_pr_file(pr_id, file_path):
+    """
+    Returns one file of a PR: its metadata, parsed hunks, processed contents and review feedback.
+    """
+    try:
+        validators = pr_cache_validators(pr_id)
+        if validators is None:
+            return jsonify({'error': 'PR not found'}), 404
+        cached = not_modified(*validators)
+        if cached is not None:
+            return cached
+
+        pr_file = PRFile.query.options(undefer_group('payload')).filter_by(pr_id=pr_id, path=file_path).first()
+        if pr_file is None:
+            return jsonify({'error': 'File not found'}), 404
+        review = FileReview.query.filter_by(pr_id=pr_id, path=file_path).first()
+        file_data = serialize_pr_file(pr_file, review is not None and review.feedback is not None)
+        file_data.update({
+            'hunks': json.loads(pr_file.hunks or '[]'),
+            'content': pr_file.content or '',
+            'feedback': review.feedback if review else None,
+            'reviewedCommitHash': review.commitHash if review else None,
+        })
+        return add_validators(jsonify(file_data), *validators), 200
+    except Exception as e:
+        logging.error(f"Error fetching file {file_path} of PR {pr_id}: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
 @main.route('/api/pr/<string:pr_id>/feedback', methods=['GET'])
 def get_feedback(pr_id):
     try:
-        pr_entry = PR.query.filter_by(pr_id=pr_id).first()
-        if pr_entry is None:
+        validators = pr_cache_validators(pr_id)
+        if validators is None:
+            return jsonify({'error': 'PR not found'}), 404
+        cached = not_modified(*validators)
+        if cached is not None:
+            return cached
+
+        found, feedback = get_pr_column(pr_id, PR.feedback)
+        if not found:
             return jsonify({'error': 'PR not found'}), 404
-        return jsonify({'contents': pr_entry.feedback}), 200
+        return add_validators(jsonify({'contents': feedback}), *validators), 200
     except Exception as e:
         logging.error(f"Error fetching PR contents {pr_id}: {e}")
-        return jsonify({'error': 'Internal server error'}), 
+        return jsonify({'error': 'Internal server error'}), 500
+
+@main.route('/api/pr/<string:pr_id>/initial-feedback', methods=['GET'])
+def get_initial_feedback(pr_id):
+    try:
+        validators = pr_cache_validators(pr_id)
+        if validators is None:
+            return jsonify({'error': 'PR not found'}), 404
+        cached = not_modified(*validators)
+        if cached is not None:
+            return cached
+
+        found, initial_feedback = get_pr_column(pr_id, PR.initialFeedback)
+        if not found:
+            return jsonify({'error': 'PR not found'}), 404
+        return add_validators(jsonify({'contents': initial_feedback}), *validators), 200
+    except Exception as e:
+        logging.error(f"Error fetching PR initial feedback {pr_id}: {e}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+def build_chat_payload(pr_entry, user_message):
+    """
+    Builds the Groq chat payload for a user's question about a PR, with the parts of the PR relevant to the
+    question as context. See chat_memory.build_chat_messages and retrieval.retrieve_context.
+    """
+    return {
+        "model": get_model_name(),
+        "messages": build_chat_messages(pr_entry, user_message, context=retrieve_context(pr_entry, user_message))
+    }
 
 # Groq API interaction route
 @main.route('/api/pr/<string:pr_id>/groq-response', methods=['POST'])
@@ -282,63 +565,94 @@ def groq_response(pr_id):
             logging.error("GROQ_API_KEY missing in environment")
             return jsonify({'error': 'API key missing'}), 500
 
-        # Groq API endpoint and request details
-        groq_url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            'Authorization': f'Bearer {groq_api_key}',
-            'Content-Type': 'application/json'
-        }
-
-        # Load the prompt from the file
-        prompt_file_path = os.path.join(os.path.dirname(__file__), 'groqPrompt')
-        if not os.path.exists(prompt_file_path):
+        if not prompts.exists('groqPrompt'):
             return jsonify({'error': 'Prompt file not found'}), 404
-        
-        with open(prompt_file_path, 'r') as file:
-            prompt_text = file.read().strip()
 
         pr_entry = PR.query.filter_by(pr_id=pr_id).first()
         if pr_entry is None:
             return jsonify({'error': 'PR not found'}), 404
-        if not pr_entry.initialFeedback:
-            pr_entry.initialFeedback = pr_entry.feedback
-        prompt_text += "\nPull request contents: " + pr_entry.content + "\nYour initial feedback of the pull request: " + pr_entry.initialFeedback + "\nConversation history between you and the user about the code and feedback:\n"
+        payload = build_chat_payload(pr_entry, user_message)
 
-        # Retrieve all messages related to this pr_id
-        pr_chat_history = [{
-            'role': conv.role,
-            'message': conv.message,
-            'date_created': conv.date_created.isoformat()
-        } for conv in sorted(pr_entry.convo, key=lambda x: x.date_created)]
-        
-        # Convert chat history to string and append to prompt
-        pr_chat_history_str = ""
-        for entry in pr_chat_history:
-            entry_str = f"'Role': {entry['role']}\n'Message': '{entry['message']}'\n'Date_created': '{entry['date_created']}'\n"
-            pr_chat_history_str += entry_str + "\n" 
-        prompt_text += pr_chat_history_str
-
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [
-                {"role": "system", "content": prompt_text},
-                {"role": "user", "content": user_message}
-            ]
-        }
-
-        # Make a POST request to Groq API
         logging.info(f"Sending message to Groq API: {user_message}")
-        response = requests.post(groq_url, headers=headers, json=payload)
-
-        # Check for successful response from Groq API
-        if response.status_code == 200:
-            bot_response = response.json().get('choices', [])[0]['message']['content']
-            logging.info(f"Received response from Groq API: {bot_response}")
-            return jsonify({'response': bot_response}), 200
-        else:
-            logging.error(f"Failed to get response from Groq API, status code: {response.status_code}, response: {response.text}")
+        try:
+            bot_response = get_llm_gateway().chat(payload['messages'], model=payload['model'])
+        except APIError as e:
+            logging.error(f"Failed to get response from Groq API: {e}")
             return jsonify({'error': 'Failed to get response from Groq API'}), 500
 
+        logging.info(f"Received response from Groq API: {bot_response}")
+        schedule_memory_update(current_app._get_current_object(), pr_id)
+        return jsonify({'response': bot_response}), 200
+
     except Exception as e:
         logging.error(f"Error in groq_response: {e}")
         return jsonify({'error': str(e)}), 500
+
+def sse_event(data, event=None):
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+# Streaming variant of groq_response using Server-Sent Events. Tokens are forwarded as they arrive
+# ('data: {"token": ...}'), and the complete answer is saved to the convo table once the stream finishes.
+@main.route('/api/pr/<string:pr_id>/groq-response/stream', methods=['POST'])
+def groq_response_stream(pr_id):
+    try:
+        data = request.json
+        user_message = data.get('message')
+        if not user_message:
+            logging.error("No message provided by user")
+            return jsonify({'error': 'No message provided'}), 400
+
+        groq_api_key = os.getenv('GROQ_API_KEY')
+        if not groq_api_key:
+            logging.error("GROQ_API_KEY missing in environment")
+            return jsonify({'error': 'API key missing'}), 500
+
+        if not prompts.exists('groqPrompt'):
+            return jsonify({'error': 'Prompt file not found'}), 404
+
+        pr_entry = PR.query.filter_by(pr_id=pr_id).first()
+        if pr_entry is None:
+            return jsonify({'error': 'PR not found'}), 404
+        payload = build_chat_payload(pr_entry, user_message)
+
+        logging.info(f"Streaming message to Groq API: {user_message}")
+        try:
+            upstream = get_llm_gateway().stream_chat(payload['messages'], model=payload['model'])
+        except APIError as e:
+            logging.error(f"Failed to get response from Groq API: {e}")
+            return jsonify({'error': 'Failed to get response from Groq API'}), 500
+    except Exception as e:
+        logging.error(f"Error in groq_response_stream: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    def generate():
+        parts = []
+        completed = False
+        try:
+            for token in upstream:
+                parts.append(token)
+                yield sse_event({'token': token})
+            completed = True
+
+            bot_response = "".join(parts)
+            db.session.add(Conversation(pr_id=pr_id, message=bot_response, date_created=datetime.now(), role='System'))
+            db.session.commit()
+            logging.info(f"Streamed response from Groq API: {bot_response}")
+            schedule_memory_update(current_app._get_current_object(), pr_id)
+            yield sse_event({'response': bot_response}, event='done')
+        except GeneratorExit:
+            # The client went away; stop reading from Groq and don't save a partial answer
+            logging.info(f"Client disconnected from groq-response stream for PR {pr_id}")
+        except Exception as e:
+            if not completed:
+                logging.error(f"Error streaming from Groq API: {e}")
+            else:
+                db.session.rollback()
+                logging.error(f"Error saving streamed response: {e}")
+            yield sse_event({'error': str(e)}, event='error')
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -0,0 +1,68 @@
+"""
+Measure the storage savings and CPU cost of the compressed PR payload columns (api.compression).
+
+Uses the stored rawDiff/content/feedback of the PRs in the app's database, or with --path the text files under a
+directory as a stand-in for diffs and file contents.
+
+    python -m api.scripts.bench_compression
+    python -m api.scripts.bench_compression --path api
+"""
+import os
+import time
+import argparse
+
+os.environ.setdefault("REVIEW_WORKERS_AUTOSTART", "false")
+
+from api.index import app
+from api.models import PR
+from api.compression import compress_text, decompress_text, zstandard
+
+def load_samples(path, limit):
+    samples = []
+    if path:
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    with open(os.path.join(root, name), 'r') as file:
+                        samples.append(file.read())
+                except (UnicodeDecodeError, OSError):
+                    continue
+        return samples[:limit]
+    with app.app_context():
+        for pr in PR.query.limit(limit).all():
+            samples.extend(value for value in (pr.rawDiff, pr.content, pr.initialFeedback, pr.feedback) if value)
+    return samples
+
+def measure(samples, codec):
+    started = time.perf_counter()
+    compressed = [compress_text(text, codec=codec) for text in samples]
+    write_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for value in compressed:
+        decompress_text(value)
+    read_seconds = time.perf_counter() - started
+    return sum(len(value) for value in compressed), write_seconds, read_seconds
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', help="Directory of text files to use instead of the stored PRs")
+    parser.add_argument('--limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    samples = load_samples(args.path, args.limit)
+    raw_size = sum(len(text.encode('utf-8')) for text in samples)
+    if not raw_size:
+        print("No samples found")
+        return
+    megabytes = raw_size / 1024 / 1024
+    print(f"{len(samples)} values, {raw_size} bytes uncompressed\n")
+    print(f"{'codec':<8}{'stored bytes':>14}{'saved':>8}{'write MB/s':>12}{'read MB/s':>12}")
+    for codec in ['none', 'zlib'] + (['zstd'] if zstandard else []):
+        size, write_seconds, read_seconds = measure(samples, codec)
+        print(f"{codec:<8}{size:>14}{(1 - size / raw_size) * 100:>7.1f}%"
+              f"{megabytes / max(write_seconds, 1e-9):>12.1f}{megabytes / max(read_seconds, 1e-9):>12.1f}")
+    if not zstandard:
+        print("\nzstd not measured: install the optional zstandard package")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Local stand-ins for the Bitbucket Cloud and Groq APIs, used by bench_load and for running the app without
+credentials. Both serve generated data with a configurable latency and rate of 429 responses.
+
+Bitbucket: POST /site/oauth2/access_token, and under /2.0/repositories/<workspace>/<repo>: pullrequests (paginated,
+with the 'updated_on >=' query used by the incremental sync), pullrequests/<id>/diff, refs/branches/<name> and
+src/<commit>/<path>. Groq: POST .../chat/completions, streamed or not.
+
+    python -m api.scripts.fake_services --prs 200 --latency 0.05 --rate-429 0.02
+
+prints the environment variables that point the app at the running services.
+"""
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit, parse_qs, unquote, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeService:
+    """
+    A threaded HTTP server on a free local port. Each request waits for the configured latency and is answered with
+    a 429 (with Retry-After) at rate_429; request counts are kept per route.
+    """
+
+    def __init__(self, latency=0.0, rate_429=0.0, retry_after=0.1, seed=0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                service._handle(self, 'GET')
+
+            def do_POST(self):
+                service._handle(self, 'POST')
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def _record(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _throttle(self):
+        with self._lock:
+            return self.random.random() < self.rate_429
+
+    def _handle(self, handler, method):
+        parts = urlsplit(handler.path)
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = handler.rfile.read(length) if length else b''
+        if self.latency:
+            time.sleep(self.latency)
+        route = self.route(method, unquote(parts.path), parse_qs(parts.query), body)
+        if route is None:
+            self._record('not_found')
+            return self.send(handler, 404, {'error': {'message': 'Not found'}})
+        name, respond = route
+        self._record(name)
+        if self._throttle():
+            self._record('429')
+            return self.send(handler, 429, {'error': {'message': 'Rate limit exceeded'}},
+                             headers={'Retry-After': str(self.retry_after)})
+        respond(handler)
+
+    def route(self, method, path, query, body):
+        """
+        Return (route name, respond(handler)) for a request, or None for a 404.
+        """
+        raise NotImplementedError
+
+    def send(self, handler, status, payload, content_type='application/json', headers=None):
+        data = payload if isinstance(payload, bytes) else (
+            json.dumps(payload) if content_type == 'application/json' else payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+class FakeBitbucket(FakeService):
+    """
+    A repository of pr_count open PRs, numbered from 1, each changing files_per_pr files of lines_per_file lines
+    in hunks_per_file places. All data is derived from the PR id, so it is the same on every run.
+    """
+
+    def __init__(self, pr_count=200, files_per_pr=5, lines_per_file=300, hunks_per_file=3, page_size=50,
+                 workspace='bench', repo_slug='repo', **kwargs):
+        super().__init__(**kwargs)
+        self.pr_count = pr_count
+        self.files_per_pr = files_per_pr
+        self.lines_per_file = lines_per_file
+        self.hunks_per_file = hunks_per_file
+        self.page_size = page_size
+        self.repo_path = f"/2.0/repositories/{workspace}/{repo_slug}"
+        self.started = datetime(2024, 1, 1)
+
+    @property
+    def api_url(self):
+        return f"{self.url}/2.0"
+
+    @property
+    def token_url(self):
+        return f"{self.url}/site/oauth2/access_token"
+
+    def commit_hash(self, pr_id):
+        return hashlib.sha1(f"pr-{pr_id}".encode('utf-8')).hexdigest()
+
+    def file_paths(self, pr_id):
+        return [f"src/module_{pr_id}/file_{index}.py" for index in range(self.files_per_pr)]
+
+    def file_contents(self, path):
+        lines = [f"def {path.replace('/', '_').replace('.', '_')}():"]
+        lines.extend(f"    value_{line} = compute(value_{line - 1}, {line})" for line in range(1, self.lines_per_file))
+        return "\n".join(lines) + "\n"
+
+    def changed_lines(self, path):
+        step = max(self.lines_per_file // (self.hunks_per_file + 1), 4)
+        return [step * (hunk + 1) for hunk in range(self.hunks_per_file) if step * (hunk + 1) < self.lines_per_file - 3]
+
+    def diff(self, pr_id):
+        parts = []
+        for path in self.file_paths(pr_id):
+            lines = self.file_contents(path).splitlines()
+            parts.extend([f"diff --git a/{path} b/{path}", "index 1111111..2222222 100644",
+                          f"--- a/{path}", f"+++ b/{path}"])
+            for line in self.changed_lines(path):
+                # One changed line with three lines of context on each side (line numbers are 1-based)
+                start = line - 3
+                parts.append(f"@@ -{start + 1},7 +{start + 1},7 @@")
+                parts.extend(f" {text}" for text in lines[start:line])
+                parts.append(f"-{lines[line]}")
+                parts.append(f"+{lines[line].replace('compute(', 'compute_fast(')}")
+                parts.extend(f" {text}" for text in lines[line + 1:line + 4])
+        return "\n".join(parts) + "\n"
+
+    def pull_request(self, pr_id):
+        created = self.started + timedelta(hours=pr_id)
+        return {
+            'id': pr_id,
+            'title': f"Benchmark PR {pr_id}",
+            'state': 'OPEN',
+            'created_on': created.isoformat() + '+00:00',
+            'updated_on': (created + timedelta(minutes=30)).isoformat() + '+00:00',
+            'source': {'branch': {'name': f"feature/{pr_id}"}, 'commit': {'hash': self.commit_hash(pr_id)}},
+            'destination': {'branch': {'name': 'main'}, 'commit': {'hash': self.commit_hash(0)}},
+        }
+
+    def pull_requests_page(self, query):
+        prs = [self.pull_request(pr_id) for pr_id in range(1, self.pr_count + 1)]
+        match = re.match(r'updated_on >= (.+)', query.get('q', [''])[0])
+        if match:
+            since = datetime.fromisoformat(match.group(1).strip().strip('"'))
+            prs = [pr for pr in prs if datetime.fromisoformat(pr['updated_on']) >= since]
+        if query.get('sort', [''])[0] == '-updated_on':
+            prs.reverse()
+        page = int(query.get('page', ['1'])[0])
+        page_size = min(int(query.get('pagelen', [self.page_size])[0]), self.page_size)
+        data = {'values': prs[(page - 1) * page_size:page * page_size], 'page': page, 'pagelen': page_size,
+                'size': len(prs)}
+        if page * page_size < len(prs):
+            next_query = {key: values[0] for key, values in query.items()}
+            next_query.update(page=page + 1, pagelen=page_size)
+            data['next'] = f"{self.url}{self.repo_path}/pullrequests?{urlencode(next_query)}"
+        return data
+
+    def route(self, method, path, query, body):
+        if method == 'POST' and path == '/site/oauth2/access_token':
+            return 'token', lambda handler: self.send(handler, 200, {'access_token': 'bench-token', 'expires_in': 3600})
+        if method != 'GET' or not path.startswith(self.repo_path + '/'):
+            return None
+        path = path[len(self.repo_path) + 1:]
+        if path == 'pullrequests':
+            return 'pullrequests', lambda handler: self.send(handler, 200, self.pull_requests_page(query))
+        match = re.fullmatch(r'pullrequests/(\d+)/diff', path)
+        if match:
+            diff = self.diff(int(match.group(1)))
+            return 'diff', lambda handler: self.send(handler, 200, diff, content_type='text/plain')
+        if path.startswith('refs/branches/'):
+            branch = path[len('refs/branches/'):]
+            commit = hashlib.sha1(f"branch-{branch}".encode('utf-8')).hexdigest()
+            return 'branch', lambda handler: self.send(handler, 200, {'name': branch, 'target': {'hash': commit}})
+        match = re.fullmatch(r'src/([^/]+)/(.+)', path)
+        if match:
+            contents = self.file_contents(match.group(2))
+            return 'src', lambda handler: self.send(handler, 200, contents, content_type='text/plain')
+        return None
+
+class FakeGroq(FakeService):
+    """
+    Answers chat completions with completion_words words of generated review text. Streamed requests get the
+    answer as server-sent event chunks.
+    """
+
+    def __init__(self, completion_words=300, **kwargs):
+        super().__init__(**kwargs)
+        self.completion_words = completion_words
+
+    def completion_text(self):
+        words = [f"word{index % 50}" for index in range(self.completion_words)]
+        return "***Description***\n" + " ".join(words[:len(words) // 2]) + "\n\n***Suggestions***\n1. " + \
+            " ".join(words[len(words) // 2:])
+
+    def route(self, method, path, query, body):
+        if method != 'POST' or not path.endswith('/chat/completions'):
+            return None
+        request = json.loads(body or b'{}')
+        prompt_words = sum(len(str(message.get('content', '')).split()) for message in request.get('messages', []))
+        text = self.completion_text()
+        usage = {'prompt_tokens': prompt_words, 'completion_tokens': self.completion_words,
+                 'total_tokens': prompt_words + self.completion_words}
+        base = {'id': 'chatcmpl-bench', 'created': int(time.time()), 'model': request.get('model', 'bench')}
+        if not request.get('stream'):
+            completion = dict(base, object='chat.completion', usage=usage, choices=[
+                {'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}])
+            return 'completions', lambda handler: self.send(handler, 200, completion)
+
+        def stream(handler):
+            handler.send_response(200)
+            handler.send_header('Content-Type', 'text/event-stream')
+            handler.send_header('Connection', 'close')
+            handler.end_headers()
+            pieces = re.findall(r'\S+\s*', text)
+            for index in range(0, len(pieces), 10):
+                chunk = dict(base, object='chat.completion.chunk', choices=[
+                    {'index': 0, 'delta': {'content': "".join(pieces[index:index + 10])}, 'finish_reason': None}])
+                handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.close_connection = True
+
+        return 'completions_stream', stream
+
+def environment(bitbucket, groq):
+    """
+    The environment variables that point the app at the given fake services.
+    """
+    return {
+        'BITBUCKET_TOKEN_URL': bitbucket.token_url,
+        'BITBUCKET_API_URL': bitbucket.api_url,
+        'BITBUCKET_KEY': 'bench',
+        'BITBUCKET_SECRET': 'bench',
+        'BITBUCKET_WORKSPACE': bitbucket.repo_path.split('/')[3],
+        'BITBUCKET_REPO_SLUG': bitbucket.repo_path.split('/')[4],
+        'GROQ_BASE_URL': groq.url,
+        'GROQ_API_KEY': 'bench',
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--prs', type=int, default=200)
+    parser.add_argument('--files-per-pr', type=int, default=5)
+    parser.add_argument('--lines-per-file', type=int, default=300)
+    parser.add_argument('--completion-words', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every Bitbucket request")
+    parser.add_argument('--groq-latency', type=float, default=0.5, help="Seconds added to every Groq request")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Fraction of requests answered with a 429")
+    args = parser.parse_args()
+
+    bitbucket = FakeBitbucket(pr_count=args.prs, files_per_pr=args.files_per_pr, lines_per_file=args.lines_per_file,
+                              latency=args.latency, rate_429=args.rate_429).start()
+    groq = FakeGroq(completion_words=args.completion_words, latency=args.groq_latency, rate_429=args.rate_429).start()
+    for name, value in environment(bitbucket, groq).items():
+        print(f"export {name}={value}")
+    try:
+        while True:
+            time.sleep(60)
+            print(f"bitbucket: {bitbucket.snapshot()}  groq: {groq.snapshot()}")
+    except KeyboardInterrupt:
+        bitbucket.stop()
+        groq.stop()
+
+if __name__ == '__main__':
+    main()
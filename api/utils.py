@@ -1,50 +1,45 @@
 import os
+import json
+import time
+import hashlib
 import logging
 import requests
-from groq import Groq
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from .index import db
 from .models import PR
+from .bitbucket import get_bitbucket_client
+from .file_cache import get_file_cache
+from .diff_parser import parse_diff, NEW_FILE_PLACEHOLDER
+from .review_cache import review_cache_key, get_cached_review, store_review
+from .llm import get_llm_gateway, prompts
+from .chunking import estimate_tokens, truncate_around_hunks, extract_hunk_context, pack_batches, merge_reviews, split_review_by_file
 from datetime import datetime
 from dotenv import load_dotenv
-import requests
-from requests.auth import HTTPBasicAuth
 from pytz import timezone, utc
 from flask import jsonify
 
 # Load environment variables from the .env file
 load_dotenv()
 
-def get_all_prs_from_repo():
+def get_all_prs_from_repo(updated_since=None):
     """
     Fetch all pull requests from Bitbucket repository, including all states and handling pagination.
+    If updated_since (an ISO 8601 timestamp) is given, only PRs updated at or after it are fetched, newest first.
     """
     try:
-        # Get Bitbucket credentials from environment variables
-        BITBUCKET_KEY = os.getenv("BITBUCKET_KEY")
-        BITBUCKET_SECRET = os.getenv("BITBUCKET_SECRET")
-        BITBUCKET_WORKSPACE = os.getenv("BITBUCKET_WORKSPACE")
-        BITBUCKET_REPO_SLUG = os.getenv("BITBUCKET_REPO_SLUG")
-
-        # Obtain access token
-        token_url = "https://bitbucket.org/site/oauth2/access_token"
-        token_response = requests.post(
-            token_url,
-            data={"grant_type": "client_credentials"},
-            auth=HTTPBasicAuth(BITBUCKET_KEY, BITBUCKET_SECRET)
-        )
-        token_response.raise_for_status()
-        access_token = token_response.json()["access_token"]
-
-        # Set up for PR fetching
-        headers = {'Authorization': f'Bearer {access_token}'}
-        url = f"https://api.bitbucket.org/2.0/repositories/{BITBUCKET_WORKSPACE}/{BITBUCKET_REPO_SLUG}/pullrequests"
+        client = get_bitbucket_client()
+        url = f"{client.repo_url}/pullrequests"
         params = {'state': 'ALL', 'pagelen': 50}
+        if updated_since:
+            params['q'] = f'updated_on >= {updated_since}'
+            params['sort'] = '-updated_on'
         
         all_prs = []
 
         # Fetch PRs with pagination
         while url:
-            response = requests.get(url, headers=headers, params=params)
+            response = client.get(url, params=params)
             response.raise_for_status()
             data = response.json()
             all_prs.extend(data['values'])
@@ -58,82 +53,116 @@ def get_all_prs_from_repo():
         logging.error(f"Error fetching PRs from Bitbucket: {e}")
         raise
 
-def get_pr_from_repo(pr_id):
+def get_pr_from_repo(pr_id, stream=False):
     #Improved try catch for error logging
     try:
-        BITBUCKET_KEY = os.getenv("BITBUCKET_KEY")
-        BITBUCKET_SECRET = os.getenv("BITBUCKET_SECRET")
-
-        token_url = "https://bitbucket.org/site/oauth2/access_token"
-        response = requests.post(
-            token_url,
-            data={"grant_type": "client_credentials"},
-            auth=HTTPBasicAuth(BITBUCKET_KEY, BITBUCKET_SECRET)
-        )
-        if response.status_code == 200:
-            access_token = response.json().get("access_token")
-            BITBUCKET_WORKSPACE = os.getenv("BITBUCKET_WORKSPACE")
-            BITBUCKET_REPO_SLUG = os.getenv("BITBUCKET_REPO_SLUG")
-            url = f"https://api.bitbucket.org/2.0/repositories/{BITBUCKET_WORKSPACE}/{BITBUCKET_REPO_SLUG}/pullrequests/{pr_id}/diff"
-            headers = {'Authorization': f'Bearer {access_token}'}
-
-            reply = requests.get(url, headers=headers)
-            if reply.status_code == 200:
-                return reply
-            else:
-                logging.error(f"Failed to fetch PR: {reply.status_code}, {reply.text}")
-                raise Exception(f"Failed to fetch PR: {reply.status_code}")
+        reply = get_bitbucket_client().get(f"pullrequests/{pr_id}/diff", stream=stream)
+        if reply.status_code == 200:
+            return reply
         else:
-            logging.error(f"Failed to get access token: {response.status_code}, {response.text}")
-            raise Exception("Failed to get access token")
+            logging.error(f"Failed to fetch PR: {reply.status_code}, {reply.text}")
+            raise Exception(f"Failed to fetch PR: {reply.status_code}")
     except Exception as e:
         logging.error(f"Error fetching PR from Bitbucket: {e}")
         raise
 
-def get_file_contents(file_path, target_branch):
+def get_branch_commit(branch_name):
+    """
+    Resolve a branch name to the hash of the commit it currently points to.
+    """
     try:
-        BITBUCKET_KEY = os.getenv("BITBUCKET_KEY")
-        BITBUCKET_SECRET = os.getenv("BITBUCKET_SECRET")
-
-        token_url = "https://bitbucket.org/site/oauth2/access_token"
-        response = requests.post(
-            token_url,
-            data={"grant_type": "client_credentials"},
-            auth=HTTPBasicAuth(BITBUCKET_KEY, BITBUCKET_SECRET)
-        )
+        response = get_bitbucket_client().get(f"refs/branches/{branch_name}")
         if response.status_code == 200:
-            access_token = response.json().get("access_token")
-            BITBUCKET_WORKSPACE = os.getenv("BITBUCKET_WORKSPACE")
-            BITBUCKET_REPO_SLUG = os.getenv("BITBUCKET_REPO_SLUG")
-
-            url = f"https://api.bitbucket.org/2.0/repositories/{BITBUCKET_WORKSPACE}/{BITBUCKET_REPO_SLUG}/src/{target_branch}/{file_path}"
-            headers = {'Authorization': f'Bearer {access_token}'}
-            
-            response = requests.get(url, headers=headers)
-            if response.status_code == 200:
-                return response.text
-            elif response.status_code == 404:
-                logging.info(f"File '{file_path}' is a new file.")
-                return "<This is a new file with no original content.>"
-            else:
-                logging.error(f"Failed to fetch file content: {response.status_code}, {response.text}")
-                return None
+            return response.json()['target']['hash']
         else:
-            logging.error(f"Failed to get access token: {response.status_code}, {response.text}")
-            raise Exception("Failed to get access token")
+            logging.error(f"Failed to resolve branch '{branch_name}': {response.status_code}, {response.text}")
+            raise Exception(f"Failed to resolve branch: {response.status_code}")
+    except Exception as e:
+        logging.error(f"Error resolving branch from Bitbucket: {e}")
+        raise
+
+def get_file_contents(file_path, target_branch, commit_hash=None):
+    """
+    Gets the contents of file_path on the target branch.
+    When the branch has been resolved to commit_hash, the file is read at that commit and served from the
+    content-addressed file cache where possible. Without a commit hash the cache is bypassed.
+    """
+    cache = get_file_cache() if commit_hash else None
+    if cache:
+        cached = cache.get(commit_hash, file_path)
+        if cached is not None:
+            return cached
+
+    try:
+        response = get_bitbucket_client().get(f"src/{commit_hash or target_branch}/{file_path}")
+        if response.status_code == 200:
+            contents = response.text
+        elif response.status_code == 404:
+            logging.info(f"File '{file_path}' is a new file.")
+            contents = NEW_FILE_PLACEHOLDER
+        else:
+            logging.error(f"Failed to fetch file content: {response.status_code}, {response.text}")
+            return None
     except Exception as e:
         logging.error(f"Error fetching file contents from Bitbucket: {e}")
         raise
 
-def get_raw_files_diff(pr_id):
-    response = get_pr_from_repo(pr_id)
-    if response.status_code != 200:
-        logging.error(f"Failed to retrieve PR diff: {response.status_code}, {response.text}")
-        raise Exception("Failed to retrieve PR diff!!")
-    else:
-        return response.text
+    if cache:
+        cache.set(commit_hash, file_path, contents)
+    return contents
 
-def get_files_diff(pr_id, target_branch):
+def fetch_files_contents(file_paths, target_branch, max_workers=None):
+    """
+    Fetch the contents of several files from the target branch concurrently.
+    The branch is resolved to a commit once so every file is read from the same snapshot and can be served from
+    the file cache. Requests go through a bounded thread pool sharing the Bitbucket client's connection pool, and
+    the results are returned in the same order as file_paths. Total and per-file fetch times are logged.
+    """
+    if not file_paths:
+        return []
+    try:
+        commit_hash = get_branch_commit(target_branch)
+    except Exception:
+        logging.info(f"Could not resolve '{target_branch}' to a commit, fetching file contents without the cache.")
+        commit_hash = None
+    max_workers = max_workers or int(os.getenv("BITBUCKET_MAX_WORKERS", 8))
+    timings = {}
+
+    def timed_fetch(file_path):
+        start = time.perf_counter()
+        try:
+            return get_file_contents(file_path, target_branch, commit_hash)
+        finally:
+            timings[file_path] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+        contents = list(executor.map(timed_fetch, file_paths))
+    total = time.perf_counter() - start
+
+    logging.info(f"Fetched {len(file_paths)} file(s) from '{target_branch}' in {total:.2f}s")
+    for file_path in file_paths:
+        logging.info(f"  {file_path}: {timings.get(file_path, 0):.2f}s")
+    return contents
+
+def iter_raw_files_diff(pr_id, chunk_size=64 * 1024):
+    """
+    Stream the PR diff from Bitbucket and yield its lines as bytes, without their line endings. Only the current
+    chunk of the response is held in memory. Lines are split on b'\n' only, so a '\r' inside a line is kept.
+    """
+    response = get_pr_from_repo(pr_id, stream=True)
+    try:
+        pending = b''
+        for chunk in response.iter_content(chunk_size):
+            lines = (pending + chunk).split(b'\n')
+            pending = lines.pop()
+            yield from lines
+        if pending:
+            yield pending
+    finally:
+        response.close()
+
+def get_files_diff(pr_id, target_branch, diff=None):
     """
     Gets the file diff from bitbucket based on the given pr_id, and extracts the required data into 'detailed_changes'.
     'detailed_changes' is a list of files that have changed. For each file, there is a dict containing the path of the file,
@@ -151,125 +180,220 @@ def get_files_diff(pr_id, target_branch):
         'lines_removed': []
         }
     ]
+    diff is the diff text or an iterable of its lines (e.g. the lines streamed by prepare_pr). By default the diff
+    is streamed from bitbucket and parsed as it arrives, one file at a time.
     """
-    response = get_pr_from_repo(pr_id)
-    if response.status_code != 200:
-        logging.error(f"Failed to retrieve PR diff: {response.status_code}, {response.text}")
-        raise Exception("Failed to retrieve PR diff!!")
-    else:
-        diff_text = response.text
-        detailed_changes = []
-        current_file = None
-        lines_added = []
-        lines_removed = []
-
-        for line in diff_text.splitlines():
-            if line.startswith("diff --git"):
-                if current_file:
-                    # Strip the 'a/' prefix from the path
-                    file_path = current_file.replace('a/', '').replace('b/', '')
-                    original_contents = get_file_contents(file_path, target_branch)
-                    detailed_changes.append({
-                        'path': file_path,
-                        'original_contents': original_contents,
-                        'lines_added': lines_added,
-                        'lines_removed': lines_removed
-                    })
-                current_file = line.split(" ")[2]
-                lines_added = []
-                lines_removed = []
-            elif line.startswith("@@"):
-                pass
-            elif line.startswith("+"):
-                if not (line.startswith("++ ") or line.startswith("+++") or line.startswith("new file mode")):  # Exclude metadata lines
-                    lines_added.append(line[1:])
-            elif line.startswith("-"):
-                if not (line.startswith("-- ") or line.startswith("---") or line.startswith("deleted file mode")):  # Exclude metadata lines
-                    lines_removed.append(line[1:])
-
-        if current_file:
-            # Strip the 'a/' prefix from the path
-            file_path = current_file.replace('a/', '').replace('b/', '')
-            original_contents = get_file_contents(file_path, target_branch)
-            detailed_changes.append({
-                'path': file_path,
-                'original_contents': original_contents,
-                'lines_added': lines_added,
-                'lines_removed': lines_removed
-            })
-        return detailed_changes
+    if diff is None:
+        diff = iter_raw_files_diff(pr_id)
+    detailed_changes = list(parse_diff(diff))
+
+    # Fetch the original contents of every changed file in one concurrent stage. New files have nothing to fetch,
+    # and renamed files are read from their old path on the target branch.
+    to_fetch = [item for item in detailed_changes if item['status'] != 'added' and not item['is_binary']]
+    original_contents = fetch_files_contents([item['old_path'] or item['path'] for item in to_fetch], target_branch)
+    for item, contents in zip(to_fetch, original_contents):
+        item['original_contents'] = contents
+    for item in detailed_changes:
+        if item['status'] == 'added':
+            item['original_contents'] = NEW_FILE_PLACEHOLDER
+        elif item['is_binary']:
+            item['original_contents'] = "<This is a binary file.>"
+    return detailed_changes
+
+def cancel_unchanged_lines(lines_added, lines_removed):
+    """
+    Removes lines that appear in both lines_added and lines_removed as those lines are unchanged (e.g. moved lines).
+    Lines are cancelled as a multiset in linear time: each removed occurrence cancels at most one added occurrence
+    and vice versa, so a line added three times and removed once still shows up as added twice.
+    """
+    added_counts = Counter(lines_added)
+    removed_counts = Counter(lines_removed)
+    common = added_counts & removed_counts
+
+    def remaining(lines, to_cancel):
+        to_cancel = dict(to_cancel)
+        kept = []
+        for line in lines:
+            if to_cancel.get(line):
+                to_cancel[line] -= 1
+            else:
+                kept.append(line)
+        return kept
+
+    return remaining(lines_added, common), remaining(lines_removed, common)
+
+def review_original_contents(item):
+    """
+    Returns the part of a file's original contents that goes into the review.
+    In the default 'hunk' REVIEW_CONTEXT_MODE only the enclosing function/class of each change, or
+    REVIEW_CONTEXT_LINES lines around it, is kept. Set REVIEW_CONTEXT_MODE=full to send whole files.
+    """
+    original_contents = item['original_contents'] or ""
+    if os.getenv("REVIEW_CONTEXT_MODE", "hunk") == "full" or item.get('status') == 'added' or not item.get('hunks'):
+        return original_contents
+    return extract_hunk_context(original_contents, item['hunks'], int(os.getenv("REVIEW_CONTEXT_LINES", 10)))
+
+def format_file_diff(item, original_contents=None):
+    """
+    Formats one file of the files_diff into the 'Path / Original Contents / Lines Added / Lines Removed' text.
+    original_contents overrides the file's full original contents, e.g. with the review context or a truncated
+    version of them.
+    """
+    lines_added, lines_removed = cancel_unchanged_lines(item['lines_added'], item['lines_removed'])
+    if original_contents is None:
+        original_contents = item['original_contents'] or ""
+    parts = [f"Path: {item['path']}", "Original Contents of file:", original_contents, "Lines Added:"]
+    parts.extend(f"  {line}" for line in lines_added)
+    parts.append("Lines Removed:")
+    parts.extend(f"  {line}" for line in lines_removed)
+    return "\n".join(parts)
 
 def process_files_diff(files_diff):
     """
     Formats the files_diff into a string, removing lines that appear in both lines_added and lines_removed as those lines are unchanged.
+    This is the stored PR contents, with full original contents; the review prompt is built by build_review_batches.
     """
-    formatted_string = "\n".join(
-        f"Path: {item['path']}\n"
-        f"Original Contents of file:\n" + item['original_contents'] + "\n"
-        f"Lines Added:\n" + "\n".join(f"  {line}" for line in item['lines_added'] if line not in item['lines_removed']) + "\n"
-        f"Lines Removed:\n" + "\n".join(f"  {line}" for line in item['lines_removed'] if line not in item['lines_added'])
-        for item in files_diff
-    )
-    return formatted_string
-
+    return "\n".join(format_file_diff(item) for item in files_diff)
 
-def analyze_code_with_llm(prompt, data):
+def build_review_batches(files_diff, budget=None):
     """
-    Sends the data and prompt to Groq AI.
+    Splits the files_diff into prompt-sized batches of formatted text for review.
+    Each file is formatted on its own and its token count estimated; files whose text exceeds the budget get their
+    original contents truncated around the changed hunks. Files are then packed in order into batches of at most
+    REVIEW_BATCH_TOKENS estimated tokens.
     """
-    groq_API = os.getenv("GROQ_API_KEY")
-    if not groq_API:
-        raise ValueError("GROQ_API_KEY not set in environment variables")
+    budget = budget or int(os.getenv("REVIEW_BATCH_TOKENS", 4500))
+    file_texts = [format_review_file(item, budget) for item in files_diff]
+    batches = pack_batches([estimate_tokens(text) for text in file_texts], budget)
+    return ["\n".join(file_texts[index] for index in batch) for batch in batches]
 
-    client = Groq(api_key=groq_API)
+def format_review_file(item, budget):
+    """
+    Formats one file for review, with the original contents reduced by review_original_contents. If the text
+    exceeds budget, the original contents are truncated around the changed hunks.
+    """
+    text = format_file_diff(item, original_contents=review_original_contents(item))
+    tokens = estimate_tokens(text)
+    if tokens > budget and item.get('original_contents'):
+        changes_tokens = tokens - estimate_tokens(review_original_contents(item))
+        original_budget = max(budget - changes_tokens, budget // 4)
+        truncated = truncate_around_hunks(item['original_contents'], item.get('hunks', []), original_budget)
+        text = format_file_diff(item, original_contents=truncated)
+    return text
+
+def file_diff_hash(item):
+    """
+    Hash of a file's changes: its path, status and the lines of its hunks without their line numbers, so a file
+    whose hunks only moved because of changes elsewhere in the file keeps its hash.
+    """
+    digest = hashlib.sha256(f"{item['path']}\0{item.get('old_path')}\0{item['status']}\0".encode('utf-8'))
+    for hunk in item.get('hunks', []):
+        for tag, _, _, text in hunk['lines']:
+            digest.update(f"{tag}{text}\n".encode('utf-8'))
+    return digest.hexdigest()
 
+def pr_file_records(files_diff):
+    """
+    The pr_file rows of a prepared files_diff: each file's metadata, hash, line and token counts, its parsed hunks
+    as JSON and its processed contents (the file's part of the PR contents).
+    """
+    records = []
+    for position, item in enumerate(files_diff):
+        content = format_file_diff(item)
+        records.append({
+            'position': position,
+            'path': item['path'],
+            'oldPath': item.get('old_path'),
+            'status': item['status'],
+            'isBinary': item.get('is_binary', False),
+            'contentHash': file_diff_hash(item),
+            'hunkCount': len(item.get('hunks', [])),
+            'linesAdded': len(item['lines_added']),
+            'linesRemoved': len(item['lines_removed']),
+            'promptTokens': estimate_tokens(content),
+            'hunks': json.dumps(item.get('hunks', [])),
+            'content': content,
+        })
+    return records
+
+# Sampling parameters for PR reviews. They are part of the review cache key, so changing them invalidates it.
+REVIEW_SAMPLING_PARAMS = {
+    'temperature': 0.5,
+    'max_tokens': 8192,
+    'top_p': 1,
+}
+
+def get_model_name():
+    return os.getenv("GROQ_MODEL_NAME", "llama3-8b-8192")
+
+def build_review_messages(prompt, data):
+    """
+    Builds the chat messages sent to Groq AI for a PR review.
+    """
     if data is None:
         data = ""
+    return [
+        {"role": "system", "content": prompt},
+        {"role": "user", "content": f"Please help to review the following pull request data. For each modified file, I have provided the original contents of that file, as well as the lines added and removed: \n{data}"}
+    ]
 
+def analyze_code_with_llm(prompt, data):
+    """
+    Sends the data and prompt to Groq AI.
+    """
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": prompt},
-                {"role": "user", "content": f"Please help to review the following pull request data. For each modified file, I have provided the original contents of that file, as well as the lines added and removed: \n{data}"}
-            ],
-            model=os.getenv("GROQ_MODEL_NAME", "llama3-8b-8192"),
-            temperature=0.5,
-            max_tokens=8192,
-            top_p=1,
-            stop=None,
-            stream=False,
-        )
-        return chat_completion.choices[0].message.content
+        return get_llm_gateway().chat(build_review_messages(prompt, data), model=get_model_name(), stop=None,
+                                      **REVIEW_SAMPLING_PARAMS)
     except Exception as e:
         logging.error(f"Error in LLM analysis: {e}")
         raise
 
-def queryLLM(context, user_query):
+def analyze_code_with_cache(prompt, data):
     """
-    Further queries to Groq AI. Provide context and a user query.
+    Same as analyze_code_with_llm, but returns a cached review when the same messages have already been reviewed
+    with the same model and sampling parameters.
     """
-    groq_API = os.getenv("GROQ_API_KEY")
-    if not groq_API:
-        raise ValueError("GROQ_API_KEY not set in environment variables")
-    client = Groq(api_key=groq_API)
+    return analyze_batches_with_cache(prompt, [data])[0]
 
-    if data is None:
-        data = ""
+def analyze_batches_with_cache(prompt, batches, max_workers=None):
+    """
+    Reviews several batches of PR data, returning one review per batch in the same order.
+    Cached reviews are looked up first; the remaining batches are sent to Groq AI in parallel
+    (REVIEW_MAX_PARALLEL at a time). Cache reads and writes stay on the calling thread, which holds the app context.
+    """
+    model = get_model_name()
+    cache_keys = [review_cache_key(build_review_messages(prompt, data), model, REVIEW_SAMPLING_PARAMS) for data in batches]
+    reviews = [get_cached_review(cache_key) for cache_key in cache_keys]
+
+    misses = [index for index, review in enumerate(reviews) if review is None]
+    if len(misses) < len(batches):
+        logging.info(f"Review cache hit for {len(batches) - len(misses)} of {len(batches)} batch(es)")
+    if misses:
+        max_workers = max_workers or int(os.getenv("REVIEW_MAX_PARALLEL", 4))
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(misses))) as executor:
+            results = executor.map(lambda index: analyze_code_with_llm(prompt, batches[index]), misses)
+            for index, review in zip(misses, results):
+                reviews[index] = review
+        for index in misses:
+            store_review(cache_keys[index], model, reviews[index])
+    return reviews
 
+def queryLLM(context, user_query):
+    """
+    Further queries to Groq AI. Provide context and a user query.
+    """
     try:
-        chat_completion = client.chat.completions.create(
-            messages=[
+        return get_llm_gateway().chat(
+            [
                 {"role": "system", "content": context},
                 {"role": "user", "content": user_query}
             ],
-            model=os.getenv("GROQ_MODEL_NAME", "llama3-8b-8192"),
+            model=get_model_name(),
             temperature=0.5,
             max_tokens=8192,
             top_p=1,
             stop=None,
-            stream=False,
         )
-        return chat_completion.choices[0].message.content
     except Exception as e:
         logging.error(f"Error in LLM analysis: {e}")
         raise
@@ -328,22 +452,132 @@ def handle_date(date_input, to_sgt=False, as_string=False):
         return dt.strftime('%Y-%m-%d %H:%M:%S')
     return dt
 
-def process_pr(pr_id, target_branch):
+class ReviewSuperseded(Exception):
+    """
+    Raised when a review is abandoned because a newer commit of the PR has been queued.
+    """
+
+def context_token_savings(files_diff):
+    """
+    Returns (full_tokens, context_tokens): the estimated tokens of the files' full original contents versus the
+    contents actually sent for review.
+    """
+    full_tokens = sum(estimate_tokens(item['original_contents']) for item in files_diff)
+    context_tokens = sum(estimate_tokens(review_original_contents(item)) for item in files_diff)
+    return full_tokens, context_tokens
+
+def load_review_prompt():
+    return prompts.get('prompttext')
+
+def prepare_pr(pr_id, target_branch, stats=None):
+    """
+    Fetches the PR diff once, parses it and fetches the original file contents.
+    Returns (raw_files_diff, files_diff, processed_diff). If a stats dict is given, it is filled with the estimated
+    prompt tokens and the tokens saved by sending hunk context instead of full files.
+    """
+    # Fetch the PR diff from Bitbucket once and parse it while it streams in. The lines are also kept to store
+    # the raw diff, without holding the response body, its decoded text and a copy for the parser at once.
+    raw_lines = []
+
+    def stream_diff():
+        for line in iter_raw_files_diff(pr_id):
+            raw_lines.append(line)
+            yield line
+
+    files_diff = get_files_diff(pr_id, target_branch, diff=stream_diff())
+    raw_files_diff = b"\n".join(raw_lines).decode('utf-8', errors='replace') + ("\n" if raw_lines else "")
+    raw_lines.clear()
+    processed_diff = process_files_diff(files_diff)
+
+    full_tokens, context_tokens = context_token_savings(files_diff)
+    saved_tokens = full_tokens - context_tokens
+    if full_tokens:
+        logging.info(f"PR {pr_id}: hunk context saved {saved_tokens} of {full_tokens} original-content tokens ({saved_tokens * 100 // full_tokens}%)")
+    if stats is not None:
+        # The review prompt carries the hunk context rather than the full contents stored in processed_diff
+        stats['prompt_tokens'] = estimate_tokens(processed_diff) - saved_tokens
+        stats['tokens_saved'] = saved_tokens
+    return raw_files_diff, files_diff, processed_diff
+
+def review_version():
+    """
+    Identifies what produced a review: the model and the version of the review prompt.
+    """
+    return f"{get_model_name()}:{prompts.version('prompttext')}"
+
+def review_files_diff(pr_id, files_diff, is_cancelled=None, file_reviews=None):
+    """
+    Reviews a prepared files_diff with the LLM and returns the feedback. is_cancelled is an optional callable
+    checked before the LLM call, so that a superseded review doesn't pay for a completion.
+    If a file_reviews dict is given, the review is incremental; see review_files_incrementally.
+    """
+    prompt_text = load_review_prompt()
+    if is_cancelled and is_cancelled():
+        raise ReviewSuperseded(f"Review of PR {pr_id} cancelled before the LLM call")
+    if file_reviews is not None:
+        return review_files_incrementally(pr_id, prompt_text, files_diff, file_reviews)
+    # Large PRs are reviewed in prompt-sized batches in parallel and the reviews merged back together
+    batches = build_review_batches(files_diff)
+    if len(batches) > 1:
+        logging.info(f"Reviewing PR {pr_id} in {len(batches)} batches")
+    return merge_reviews(analyze_batches_with_cache(prompt_text, batches))
+
+# Appended to incremental review batches of several files, so each suggestion can be kept with its file
+FILE_ATTRIBUTION_NOTE = "\nStart each suggestion with the path of the file it is about."
+
+def review_files_incrementally(pr_id, prompt_text, files_diff, file_reviews):
+    """
+    Reviews a PR keeping feedback per file. file_reviews maps paths to the previous
+    {'diffHash', 'reviewVersion', 'feedback'} of each file. Files whose hunks are unchanged since that review, by
+    the same model and prompt, keep their feedback. The others are packed into REVIEW_BATCH_TOKENS batches as in
+    build_review_batches, and each batch's review is split back into per-file feedback. file_reviews is updated in
+    place to the state of the current files, and the merged feedback of all files is returned.
+    """
+    version = review_version()
+    budget = int(os.getenv("REVIEW_BATCH_TOKENS", 4500))
+    hashes = [file_diff_hash(item) for item in files_diff]
+
+    changed = []
+    for item, diff_hash in zip(files_diff, hashes):
+        previous = file_reviews.get(item['path'])
+        if not previous or previous['diffHash'] != diff_hash or previous['reviewVersion'] != version:
+            changed.append(item)
+
+    file_texts = [format_review_file(item, budget) for item in changed]
+    batches = pack_batches([estimate_tokens(text) for text in file_texts], budget)
+    logging.info(f"Reviewing {len(changed)} of {len(files_diff)} file(s) of PR {pr_id} in {len(batches)} batch(es); "
+                 f"keeping the previous review of the others")
+    batch_data = ["\n".join(file_texts[index] for index in batch) + (FILE_ATTRIBUTION_NOTE if len(batch) > 1 else "")
+                  for batch in batches]
+    new_feedback = {}
+    for batch, review in zip(batches, analyze_batches_with_cache(prompt_text, batch_data)):
+        new_feedback.update(split_review_by_file(review, [changed[index]['path'] for index in batch]))
+
+    current = {}
+    for item, diff_hash in zip(files_diff, hashes):
+        feedback = new_feedback[item['path']] if item['path'] in new_feedback else file_reviews[item['path']]['feedback']
+        current[item['path']] = dict(file_reviews.get(item['path'], {}), diffHash=diff_hash, reviewVersion=version,
+                                     feedback=feedback, reviewed=item['path'] in new_feedback)
+    file_reviews.clear()
+    file_reviews.update(current)
+    return merge_reviews([state['feedback'] for state in current.values() if state['feedback']] or [""])
+
+def process_pr(pr_id, target_branch, is_cancelled=None, stats=None, file_reviews=None, pr_files=None):
+    """
+    Fetches, processes and reviews the PR diff. See prepare_pr and review_files_diff for is_cancelled, stats and
+    file_reviews. If a pr_files list is given, it is filled with the PR's per-file rows (see pr_file_records).
+    """
     try:
-        # Fetch the PR diff from Bitbucket
-        raw_files_diff = get_raw_files_diff(pr_id)
-        files_diff = get_files_diff(pr_id, target_branch)
-        processed_diff = process_files_diff(files_diff)
-
-        # Example LLM analysis (optional)
-        prompt_file_path = os.path.join(os.path.dirname(__file__), 'prompttext')
-        with open(prompt_file_path, 'r') as file:
-            prompt_text = file.read().strip()
-        feedback = analyze_code_with_llm(prompt_text, processed_diff)
+        raw_files_diff, files_diff, processed_diff = prepare_pr(pr_id, target_branch, stats=stats)
+        if pr_files is not None:
+            pr_files.extend(pr_file_records(files_diff))
+        feedback = review_files_diff(pr_id, files_diff, is_cancelled=is_cancelled, file_reviews=file_reviews)
         return raw_files_diff, processed_diff, feedback
-    except FileNotFoundError:
-        logging.error(f"Prompt file not found: {prompt_file_path}")
-        raise Exception(f"Error processing pull request: Prompt file not found: {prompt_file_path}")
+    except ReviewSuperseded:
+        raise
+    except FileNotFoundError as e:
+        logging.error(f"Prompt file not found: {e.filename}")
+        raise Exception(f"Error processing pull request: Prompt file not found: {e.filename}")
     except Exception as e:
         logging.error(f"Error processing pull request: {e}")
-        raise Exception(f"Error processing pull request: {e}")
\ No newline at end of file
+        raise Exception(f"Error processing pull request: {e}")
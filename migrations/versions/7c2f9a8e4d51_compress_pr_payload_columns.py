@@ -0,0 +1,96 @@
+"""Compress PR payload columns
+
+Revision ID: 7c2f9a8e4d51
+Revises: 0a7d4e5c3b19
+Create Date: 2026-10-18 13:58:12.640518
+
+"""
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2f9a8e4d51'
+down_revision = '0a7d4e5c3b19'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ['rawDiff', 'content', 'initialFeedback', 'feedback']
+BATCH_SIZE = 500
+
+# Same format as api.compression: a one-byte codec tag followed by the data (0 = raw UTF-8, 1 = zlib, 2 = zstd).
+# Existing rows are converted with zlib so the migration doesn't need the optional zstandard package.
+
+def _compress(text):
+    if text is None:
+        return None
+    data = text.encode('utf-8')
+    compressed = b'\x01' + zlib.compress(data, 6)
+    return compressed if len(compressed) < len(data) + 1 else b'\x00' + data
+
+def _decompress(value):
+    if value is None:
+        return None
+    value = bytes(value)
+    tag, data = value[:1], value[1:]
+    if tag == b'\x01':
+        data = zlib.decompress(data)
+    elif tag == b'\x02':
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return data.decode('utf-8')
+
+def _size(value):
+    if value is None:
+        return 0
+    return len(value.encode('utf-8')) if isinstance(value, str) else len(value)
+
+def _convert(source_type, target_type, convert):
+    """
+    Copy every payload column into a new <column>_converted column through convert, in batches of PR rows, then
+    swap the new columns in. Returns the total stored size before and after.
+    """
+    with op.batch_alter_table('PR', schema=None) as batch_op:
+        for column in COLUMNS:
+            batch_op.add_column(sa.Column(f'{column}_converted', target_type, nullable=True))
+
+    pr = sa.table('PR', sa.column('pr_id', sa.String()),
+                  *[sa.column(column, source_type) for column in COLUMNS],
+                  *[sa.column(f'{column}_converted', target_type) for column in COLUMNS])
+    connection = op.get_bind()
+    size_before = size_after = 0
+    last_pr_id = None
+    while True:
+        query = sa.select(pr.c.pr_id, *[pr.c[column] for column in COLUMNS]).order_by(pr.c.pr_id).limit(BATCH_SIZE)
+        if last_pr_id is not None:
+            query = query.where(pr.c.pr_id > last_pr_id)
+        rows = connection.execute(query).all()
+        if not rows:
+            break
+        for row in rows:
+            values = {}
+            for column in COLUMNS:
+                value = getattr(row, column)
+                converted = convert(value)
+                size_before += _size(value)
+                size_after += _size(converted)
+                values[f'{column}_converted'] = converted
+            connection.execute(sa.update(pr).where(pr.c.pr_id == row.pr_id).values(**values))
+        last_pr_id = rows[-1].pr_id
+
+    with op.batch_alter_table('PR', schema=None) as batch_op:
+        for column in COLUMNS:
+            batch_op.drop_column(column)
+            batch_op.alter_column(f'{column}_converted', new_column_name=column)
+    return size_before, size_after
+
+
+def upgrade():
+    size_before, size_after = _convert(sa.Text(), sa.LargeBinary(), _compress)
+    print(f"Compressed PR payload columns: {size_before} -> {size_after} bytes")
+
+
+def downgrade():
+    size_before, size_after = _convert(sa.LargeBinary(), sa.Text(), _decompress)
+    print(f"Decompressed PR payload columns: {size_before} -> {size_after} bytes")
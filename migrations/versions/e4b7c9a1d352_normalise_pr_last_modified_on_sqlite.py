@@ -0,0 +1,26 @@
+"""Normalise PR.last_modified on SQLite
+
+Revision ID: e4b7c9a1d352
+Revises: d83a6c2f1e47
+Create Date: 2026-10-19 09:12:47.503196
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7c9a1d352'
+down_revision = 'd83a6c2f1e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite stores timestamps as text. Values written by CURRENT_TIMESTAMP lack the fractional seconds that
+    # SQLAlchemy writes, so they compare wrongly against the /api/summary cursor; give them the same format.
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("UPDATE \"PR\" SET last_modified = last_modified || '.000000' WHERE length(last_modified) = 19")
+
+
+def downgrade():
+    pass
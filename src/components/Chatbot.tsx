@@ -57,6 +57,63 @@ const apiCall = async <T extends ApiResponse>(
   return response.json() as Promise<T>;
 };
 
+// Streams the bot's answer from the Server-Sent Events endpoint, calling onToken with the text received so far.
+// The backend saves the complete answer to the conversation history once the stream finishes.
+const streamBotResponse = async (
+  prId: string,
+  message: string,
+  onToken: (text: string) => void
+): Promise<string> => {
+  const response = await fetch(
+    `${getBaseUrl()}/pr/${prId}/groq-response/stream`,
+    {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ message }),
+    }
+  );
+
+  if (!response.ok || !response.body) {
+    const errorData = await response.json().catch(() => ({}));
+    throw new Error(
+      (errorData.error as string) || `HTTP error! status: ${response.status}`
+    );
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let botResponse = "";
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line; keep any incomplete event in the buffer
+    const events = buffer.split("\n\n");
+    buffer = events.pop() || "";
+    for (const event of events) {
+      const dataLine = event
+        .split("\n")
+        .find((line) => line.startsWith("data: "));
+      if (!dataLine) continue;
+      const payload = JSON.parse(dataLine.slice("data: ".length));
+      if (event.startsWith("event: error")) {
+        throw new Error(payload.error || "Streaming failed");
+      }
+      if (payload.token) {
+        botResponse += payload.token;
+        onToken(botResponse);
+      }
+    }
+  }
+
+  return botResponse;
+};
+
 // Function to escape HTML in code blocks
 const escapeHtml = (str: string) => {
   return str
@@ -152,20 +209,11 @@ const Chatbot: React.FC<Props> = ({ prId }) => {
     try {
       await sendConversationToAPI(userMessage, "User");
 
-      const data = await apiCall<{ response: string }>(
-        `/pr/${prId}/groq-response`,
-        "POST",
-        { message: userMessage }
-      );
-      const botResponse = data.response;
-
-      const updatedMessages = [
-        ...newMessages,
-        { content: botResponse, role: "system" },
-      ];
-      setMessages(updatedMessages);
-
-      await sendConversationToAPI(botResponse, "System");
+      // Show the answer as it streams in; the backend saves it once complete
+      setMessages([...newMessages, { content: "", role: "system" }]);
+      await streamBotResponse(prId, userMessage, (text) => {
+        setMessages([...newMessages, { content: text, role: "system" }]);
+      });
     } catch (error) {
       console.error("Error fetching bot response:", error);
       setError(
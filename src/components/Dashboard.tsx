@@ -11,8 +11,9 @@ export interface PullRequest {
   targetBranchName: string;
   created_date: string;
   last_modified: string;
-  rawDiff: string;
-  content: string;
+  rawDiff?: string; // Left out of the slim detail response, see /api/pr/<id>/raw-diff
+  content?: string;
+  fileCount?: number;
   feedback: string;
 }
 
@@ -33,23 +34,27 @@ const Dashboard: React.FC = () => {
   const [prData, setPrData] = useState<PullRequest[] | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [loading, setLoading] = useState<boolean>(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  const fetchData = async () => {
+  // Without a cursor the list is reloaded from the top; with one the next page is appended
+  const fetchData = async (cursor: string | null = null) => {
     setLoading(true);
     try {
-      const response = await fetch("/api/summary");
+      const url = cursor
+        ? `/api/summary?cursor=${encodeURIComponent(cursor)}`
+        : "/api/summary";
+      const response = await fetch(url);
       if (!response.ok) {
         throw new Error("Error fetching data from backend.");
       }
       const data = await response.json();
       if (data.entries && Array.isArray(data.entries)) {
-        console.log(data);
-        const fetchedData = data.entries.sort(
-          (a: PullRequest, b: PullRequest) =>
-            new Date(b.last_modified).getTime() -
-            new Date(a.last_modified).getTime()
+        // Entries arrive sorted by last_modified, newest first
+        const fetchedData: PullRequest[] = data.entries;
+        setPrData((previous) =>
+          cursor && previous ? [...previous, ...fetchedData] : fetchedData
         );
-        setPrData(fetchedData);
+        setNextCursor(data.next_cursor ?? null);
       } else {
         setError("Invalid data format received from the API.");
       }
@@ -84,7 +89,7 @@ const Dashboard: React.FC = () => {
         
         <button
           className="bg-blue-500 text-white py-2 px-4 rounded-full hover:bg-blue-600 transition duration-300 flex items-center space-x-2 mb-6"
-          onClick={fetchData}
+          onClick={() => fetchData()}
           disabled={loading}
         >
           <FaSync className={`${loading ? 'animate-spin' : ''}`} />
@@ -186,6 +191,17 @@ const Dashboard: React.FC = () => {
                 </tbody>
               </table>
             </div>
+            {nextCursor && (
+              <div className="px-6 py-4 bg-gray-50 border-t border-gray-200 text-center">
+                <button
+                  className="text-sm font-medium text-blue-600 hover:underline"
+                  onClick={() => fetchData(nextCursor)}
+                  disabled={loading}
+                >
+                  {loading ? "Loading..." : "Load more"}
+                </button>
+              </div>
+            )}
           </div>
         )}
       </div>
@@ -1,72 +1,185 @@
-import React, { useState } from 'react';
+import React, { useEffect, useState } from 'react';
 import { FaChevronDown, FaChevronUp } from 'react-icons/fa'; // Importing icons from react-icons
 
 interface FileChangeProps {
-  content: string;
+  prId: string;
 }
 
-const FilesChanged: React.FC<FileChangeProps> = ({ content }) => {
-  const parseContent = (content: string) => {
-    const sections = content.split(/(?=Path: )/).filter(section => section.trim() !== '');
-    const fileChanges: { path: string; originalContents: string; }[] = [];
-
-    sections.forEach(section => {
-      const lines = section.split('\n');
-      let path = '';
-      let originalContents = '';
-
-      lines.forEach((line, index) => {
-        if (line.startsWith('Path: ')) {
-          path = line.replace('Path: ', '').trim();
-        } else if (line.startsWith('Original Contents of file:')) {
-          for (let i = index + 1; i < lines.length && !lines[i].startsWith('Lines Added:'); i++) {
-            originalContents += lines[i] + '\n';
-          }
-        } 
-      });
-
-      fileChanges.push({ path, originalContents: originalContents.trim() });
+interface PRFileSummary {
+  path: string;
+  status: string;
+  linesAdded: number;
+  linesRemoved: number;
+  hasReview: boolean;
+}
+
+interface LoadedFile {
+  originalContents: string;
+  feedback: string | null;
+}
+
+const parseContent = (content: string) => {
+  const sections = content.split(/(?=Path: )/).filter(section => section.trim() !== '');
+  const fileChanges: { path: string; originalContents: string; }[] = [];
+
+  sections.forEach(section => {
+    const lines = section.split('\n');
+    let path = '';
+    let originalContents = '';
+
+    lines.forEach((line, index) => {
+      if (line.startsWith('Path: ')) {
+        path = line.replace('Path: ', '').trim();
+      } else if (line.startsWith('Original Contents of file:')) {
+        for (let i = index + 1; i < lines.length && !lines[i].startsWith('Lines Added:'); i++) {
+          originalContents += lines[i] + '\n';
+        }
+      }
     });
 
-    return fileChanges;
+    fileChanges.push({ path, originalContents: originalContents.trim() });
+  });
+
+  return fileChanges;
+};
+
+// Keep the slashes of the path, but escape everything else in it
+const fileUrl = (prId: string, path: string) =>
+  `/api/pr/${prId}/files/${path.split('/').map(encodeURIComponent).join('/')}`;
+
+const FilesChanged: React.FC<FileChangeProps> = ({ prId }) => {
+  // Files are listed first and each one is only downloaded when it's opened. PRs without stored files (not
+  // reviewed since per-file storage was added) fall back to the contents of the whole PR, fetched only then.
+  const [files, setFiles] = useState<PRFileSummary[] | null>(null);
+  const [content, setContent] = useState<string>('');
+  const [loadedFiles, setLoadedFiles] = useState<Record<string, LoadedFile>>({});
+  const [loadingPaths, setLoadingPaths] = useState<Record<string, boolean>>({});
+  const [openStates, setOpenStates] = useState<Record<string, boolean>>({}); // Track open states
+
+  useEffect(() => {
+    const fetchContent = async () => {
+      try {
+        const response = await fetch(`/api/pr/${prId}/content`);
+        if (!response.ok) {
+          throw new Error("Failed to fetch the contents of the pull request.");
+        }
+        const data = await response.json();
+        setContent(data.contents || '');
+      } catch (err) {
+        console.error(err);
+      }
+    };
+
+    const fetchFiles = async () => {
+      let prFiles: PRFileSummary[] = [];
+      try {
+        const response = await fetch(`/api/pr/${prId}/files`);
+        if (!response.ok) {
+          throw new Error("Failed to fetch the files of the pull request.");
+        }
+        const data = await response.json();
+        prFiles = data.files;
+      } catch (err) {
+        console.error(err);
+      }
+      setFiles(prFiles);
+      if (prFiles.length === 0) {
+        fetchContent();
+      }
+    };
+
+    setFiles(null);
+    setContent('');
+    setLoadedFiles({});
+    setOpenStates({});
+    fetchFiles();
+  }, [prId]);
+
+  const loadFile = async (path: string) => {
+    setLoadingPaths(prev => ({ ...prev, [path]: true }));
+    try {
+      const response = await fetch(fileUrl(prId, path));
+      if (!response.ok) {
+        throw new Error(`Failed to fetch ${path}.`);
+      }
+      const data = await response.json();
+      const [parsed] = parseContent(data.content || '');
+      setLoadedFiles(prev => ({
+        ...prev,
+        [path]: { originalContents: parsed ? parsed.originalContents : '', feedback: data.feedback },
+      }));
+    } catch (err) {
+      console.error(err);
+    } finally {
+      setLoadingPaths(prev => ({ ...prev, [path]: false }));
+    }
   };
 
-  const fileChanges = parseContent(content);
-  const [openStates, setOpenStates] = useState<boolean[]>(Array(fileChanges.length).fill(false)); // Track open states
+  const usingStoredFiles = files !== null && files.length > 0;
+  const fileChanges = usingStoredFiles ? [] : parseContent(content);
 
-  const toggleVisibility = (index: number) => {
-    setOpenStates(prev => {
-      const newStates = [...prev];
-      newStates[index] = !newStates[index];
-      return newStates;
-    });
+  const toggleVisibility = (path: string) => {
+    const opening = !openStates[path];
+    setOpenStates(prev => ({ ...prev, [path]: opening }));
+    if (opening && usingStoredFiles && !loadedFiles[path] && !loadingPaths[path]) {
+      loadFile(path);
+    }
   };
 
+  const renderHeader = (path: string, details?: React.ReactNode) => (
+    <h3
+      className="font-semibold text-lg border-b pb-2 mb-2 cursor-pointer flex items-center hover:bg-purple-200 py-2 px-2 rounded transition-all duration-300"
+      onClick={() => toggleVisibility(path)} // Toggle the specific file change
+    >
+      {/* Arrow icon */}
+      <span className="mr-2">
+        {openStates[path] ? (
+          <FaChevronUp />
+        ) : (
+          <FaChevronDown />
+        )}
+      </span>
+      {path}
+      {details}
+    </h3>
+  );
+
+  const renderContents = (originalContents: string) => (
+    <div>
+      <pre className="bg-blue-50 p-2 rounded mt-2 text-sm">
+        <code>{originalContents || 'This is a new file with no original contents'}</code>
+      </pre>
+    </div>
+  );
+
   return (
     <div className="bg-white shadow-lg rounded-lg p-4 mb-6">
+      {usingStoredFiles && files.map(({ path, status, linesAdded, linesRemoved }) => (
+        <div key={path} className="mb-4">
+          {renderHeader(path, (
+            <span className="ml-auto text-sm font-normal">
+              <span className="text-gray-500 mr-2">{status}</span>
+              <span className="text-green-600 mr-1">+{linesAdded}</span>
+              <span className="text-red-600">-{linesRemoved}</span>
+            </span>
+          ))}
+          {openStates[path] && (
+            <div className="text-gray-600">
+              {loadingPaths[path] && <p className="text-sm">Loading...</p>}
+              {loadedFiles[path] && renderContents(loadedFiles[path].originalContents)}
+              {loadedFiles[path]?.feedback && (
+                <div className="mt-2 text-sm whitespace-pre-wrap">{loadedFiles[path].feedback}</div>
+              )}
+            </div>
+          )}
+        </div>
+      ))}
       {fileChanges.map(({ path, originalContents }, index) => (
         <div key={index} className="mb-4">
-          <h3 
-            className="font-semibold text-lg border-b pb-2 mb-2 cursor-pointer flex items-center hover:bg-purple-200 py-2 px-2 rounded transition-all duration-300" 
-            onClick={() => toggleVisibility(index)} // Toggle the specific file change
-          >
-            {/* Arrow icon */}
-            <span className="mr-2">
-              {openStates[index] ? (
-                <FaChevronUp />
-              ) : (
-                <FaChevronDown />
-              )}
-            </span>
-            {path}
-          </h3>
-          {openStates[index] && (
+          {renderHeader(path)}
+          {openStates[path] && (
             <div className="text-gray-600">
-              <div>
-                <pre className="bg-blue-50 p-2 rounded mt-2 text-sm">
-                  <code>{originalContents || 'This is a new file with no original contents'}</code>
-                </pre>
-              </div>
+              {renderContents(originalContents)}
             </div>
           )}
         </div>
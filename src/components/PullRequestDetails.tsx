@@ -56,7 +56,7 @@ const PullRequestDetails: React.FC<Props> = ({ prId }) => {
       setLoading(true); // Set loading state to true when fetching data
       try {
         console.log(prId);
-        const response = await fetch(`/api/pr/${prId}`);
+        const response = await fetch(`/api/pr/${prId}?slim=true`);
         if (!response.ok) {
           throw new Error("Failed to fetch pull request details.");
         }
@@ -140,13 +140,13 @@ const PullRequestDetails: React.FC<Props> = ({ prId }) => {
             <DateInfo createdDate={prDetails.created_date} lastModified={prDetails.last_modified} />
           </div>
           <div className="mb-8">
-            <PullRequestDiff pullRequestDiff={prDetails.rawDiff} />
+            <PullRequestDiff prId={prId} />
           </div>
           <div className="mb-8">
             <h3 className="text-lg font-semibold text-gray-700 mb-2">
               Original Contents:
             </h3>
-            <FilesChanged content={prDetails.content} />
+            <FilesChanged prId={prId} />
           </div>
           <div className="mb-8">
             <h3 className="text-lg font-semibold text-gray-700 mb-2">
@@ -1,31 +1,76 @@
-import React, { useEffect } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
+import { FaChevronDown, FaChevronUp } from 'react-icons/fa';
 import * as Diff2Html from 'diff2html';
 import 'diff2html/bundles/css/diff2html.min.css';
 
 interface PullRequestDiffProps {
-  pullRequestDiff: string; 
+  prId: string;
 }
 
-const PullRequestDiff: React.FC<PullRequestDiffProps> = ({ pullRequestDiff }) => {
+// The raw diff of a large PR can be several megabytes, so it's only downloaded when the diff is first opened
+const PullRequestDiff: React.FC<PullRequestDiffProps> = ({ prId }) => {
+  const [open, setOpen] = useState<boolean>(false);
+  const [pullRequestDiff, setPullRequestDiff] = useState<string | null>(null);
+  const [loading, setLoading] = useState<boolean>(false);
+  const diffContainer = useRef<HTMLDivElement>(null);
+
+  useEffect(() => {
+    setOpen(false);
+    setPullRequestDiff(null);
+  }, [prId]);
+
+  useEffect(() => {
+    if (!open || pullRequestDiff !== null) {
+      return;
+    }
+    const fetchDiff = async () => {
+      setLoading(true);
+      try {
+        const response = await fetch(`/api/pr/${prId}/raw-diff`);
+        if (!response.ok) {
+          throw new Error("Failed to fetch the diff of the pull request.");
+        }
+        const data = await response.json();
+        setPullRequestDiff(data.rawDiff);
+      } catch (err) {
+        console.error(err);
+        setPullRequestDiff('');
+      } finally {
+        setLoading(false);
+      }
+    };
+
+    fetchDiff();
+  }, [open, prId, pullRequestDiff]);
+
   useEffect(() => {
-    if (pullRequestDiff) {
-      console.log('Raw diff data:', pullRequestDiff);
+    if (open && pullRequestDiff && diffContainer.current) {
       const diffHtml = Diff2Html.html(pullRequestDiff, {
         matching: 'lines',
         drawFileList: true
       });
-      document.getElementById('diffContainer')!.innerHTML = diffHtml; // Set the HTML content of the diff container
-    }
-    else {
-      console.log('No Raw diff data:');
+      diffContainer.current.innerHTML = diffHtml; // Set the HTML content of the diff container
     }
-  }, [pullRequestDiff]);
+  }, [open, pullRequestDiff]);
 
   return (
-    <div className="relative overflow-auto max-h-[500px]"> {/* Control overflow and max height */}
-      <div id="diffContainer" className="bg-white shadow-lg rounded-lg p-4"></div>
+    <div>
+      <h3
+        className="font-semibold text-lg border-b pb-2 mb-2 cursor-pointer flex items-center hover:bg-purple-200 py-2 px-2 rounded transition-all duration-300"
+        onClick={() => setOpen(!open)}
+      >
+        <span className="mr-2">{open ? <FaChevronUp /> : <FaChevronDown />}</span>
+        Diff
+      </h3>
+      {open && (
+        <div className="relative overflow-auto max-h-[500px]"> {/* Control overflow and max height */}
+          {loading && <p className="text-sm text-gray-600">Loading...</p>}
+          {pullRequestDiff === '' && <p className="text-sm text-gray-600">No diff available</p>}
+          <div ref={diffContainer} className="bg-white shadow-lg rounded-lg p-4"></div>
+        </div>
+      )}
     </div>
   );
 };
 
-export default PullRequestDiff;
\ No newline at end of file
+export default PullRequestDiff;
@@ -0,0 +1,16 @@
+import os
+import pytest
+
+os.environ.setdefault("REVIEW_WORKERS_AUTOSTART", "false")
+
+# The app has to be imported before the other api modules, which import db from it
+from api.index import create_app, db
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path}/test.db", 'TESTING': True})
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from api.index import db
+from api.models import PR, Conversation
+import api.chat_memory as chat_memory
+from api.chat_memory import recent_turns, split_turns, build_chat_messages, update_memory, get_memory
+
+class FakeGateway:
+    def __init__(self):
+        self.calls = []
+
+    def chat(self, messages, **kwargs):
+        self.calls.append(messages)
+        return f"summary {len(self.calls)}"
+
+def add_pr(turns):
+    pr_entry = PR(pr_id='1', title='t', status='OPEN', sourceBranchName='a', targetBranchName='b', content='C',
+                  feedback='F')
+    db.session.add(pr_entry)
+    start = datetime(2024, 1, 1)
+    for i in range(turns):
+        db.session.add(Conversation(pr_id='1', message=f"message {i}", role='User' if i % 2 == 0 else 'System',
+                                    date_created=start + timedelta(minutes=i)))
+    db.session.commit()
+    return pr_entry
+
+def turn(message):
+    return SimpleNamespace(message=message)
+
+def test_recent_turns_fit_turn_and_token_limits():
+    turns = [turn("a" * 40), turn("b"), turn("c")]
+    assert recent_turns(turns, 2, 1000) == turns[1:]
+    assert recent_turns(turns, 3, 5) == turns[1:]
+    assert recent_turns(turns, 0, 1000) == []
+
+def test_split_turns_reserves_part_of_the_window(monkeypatch):
+    monkeypatch.setenv("CHAT_MEMORY_TURNS", "4")
+    turns = [turn(str(i)) for i in range(6)]
+    assert split_turns(turns) == (turns[:2], turns[2:])
+    assert split_turns(turns, reserve_turns=2) == (turns[:4], turns[4:])
+    # At least the last turn is always kept verbatim
+    assert split_turns(turns, reserve_turns=10) == (turns[:5], turns[5:])
+
+def test_build_chat_messages_never_summarises(app, monkeypatch):
+    monkeypatch.setenv("CHAT_MEMORY_TURNS", "2")
+    gateway = FakeGateway()
+    monkeypatch.setattr(chat_memory, 'get_llm_gateway', lambda: gateway)
+    pr_entry = add_pr(6)
+
+    messages = build_chat_messages(pr_entry, "question")
+    assert gateway.calls == []
+    assert [message['content'] for message in messages[1:]] == ["message 4", "message 5", "question"]
+    assert [message['role'] for message in messages[1:]] == ['user', 'assistant', 'user']
+    assert "Pull request contents: C" in messages[0]['content']
+    assert "Summary of the earlier conversation" not in messages[0]['content']
+
+def test_update_memory_folds_expired_turns(app, monkeypatch):
+    monkeypatch.setenv("CHAT_MEMORY_TURNS", "4")
+    gateway = FakeGateway()
+    monkeypatch.setattr(chat_memory, 'get_llm_gateway', lambda: gateway)
+    pr_entry = add_pr(6)
+    turns = Conversation.query.order_by(Conversation.id).all()
+
+    assert update_memory('1')
+    memory = get_memory('1')
+    assert memory.summary == "summary 1"
+    assert memory.summarized_until_id == turns[3].id
+    assert "message 3" in gateway.calls[0][1]['content'] and "message 4" not in gateway.calls[0][1]['content']
+    # Nothing new has expired
+    assert not update_memory('1')
+    assert len(gateway.calls) == 1
+
+    messages = build_chat_messages(pr_entry, "question")
+    assert "summary 1" in messages[0]['content']
+    assert [message['content'] for message in messages[1:]] == ["message 4", "message 5", "question"]
@@ -0,0 +1,60 @@
+from api.chunking import (pack_batches, merge_reviews, split_review_sections, split_review_by_file,
+                          truncate_around_hunks, estimate_tokens)
+
+def review(description, *suggestions):
+    lines = ["***Description***", description, "", "***Suggestions***"]
+    lines.extend(f"{number}. {item}" for number, item in enumerate(suggestions, start=1))
+    return "\n".join(lines)
+
+def test_pack_batches_keeps_order_within_budget():
+    assert pack_batches([40, 40, 40, 10], 100) == [[0, 1], [2, 3]]
+
+def test_pack_batches_gives_an_oversized_item_its_own_batch():
+    assert pack_batches([10, 500, 10], 100) == [[0], [1], [2]]
+
+def test_split_review_sections():
+    description, suggestions = split_review_sections(review("Adds a parser.", "Handle errors", "Add tests"))
+    assert description == "Adds a parser."
+    assert suggestions == ["Handle errors", "Add tests"]
+
+def test_merge_reviews_renumbers_suggestions():
+    merged = merge_reviews([review("First half.", "Fix a", "Fix b"), review("Second half.", "Fix c")])
+    description, suggestions = split_review_sections(merged)
+    assert description == "First half.\n\nSecond half."
+    assert suggestions == ["Fix a", "Fix b", "Fix c"]
+    assert "3. Fix c" in merged
+
+def test_merge_reviews_drops_duplicates():
+    merged = merge_reviews([review("Same.", "Add  tests"), review("Same.", "add tests", "Fix b")])
+    description, suggestions = split_review_sections(merged)
+    assert description == "Same."
+    assert suggestions == ["Add  tests", "Fix b"]
+
+def test_merge_reviews_returns_a_single_review_unchanged():
+    assert merge_reviews(["free text"]) == "free text"
+
+def test_truncate_around_hunks_keeps_the_changed_region():
+    original = "\n".join(f"line {number}" for number in range(1, 501))
+    hunks = [{'old_start': 250, 'old_lines': 1}]
+    truncated = truncate_around_hunks(original, hunks, max_tokens=200)
+    assert estimate_tokens(truncated) <= 200
+    assert "line 250" in truncated
+    assert "line 1\n" not in truncated
+    assert "omitted" in truncated
+
+def test_split_review_by_file_keeps_a_single_file_review_unchanged():
+    text = review("Adds a parser.", "Fix a")
+    assert split_review_by_file(text, ['a.py']) == {'a.py': text}
+
+def test_split_review_by_file_attributes_suggestions_by_path():
+    text = review("Adds a parser.", "In a.py, fix x", "src/dir/b.py: rename y", "Add general tests")
+    split = split_review_by_file(text, ['a.py', 'src/dir/b.py'])
+    assert split_review_sections(split['a.py']) == ("Adds a parser.", ["In a.py, fix x", "Add general tests"])
+    # A file is also matched by its file name, and suggestions mentioning no file go under every file
+    assert split_review_sections(split['src/dir/b.py']) == ("Adds a parser.",
+                                                            ["src/dir/b.py: rename y", "Add general tests"])
+
+def test_split_review_by_file_matches_whole_names_only():
+    split = split_review_by_file(review("", "Fix data.py"), ['a.py', 'data.py'])
+    assert split_review_sections(split['a.py'])[1] == []
+    assert split_review_sections(split['data.py'])[1] == ["Fix data.py"]
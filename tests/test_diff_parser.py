@@ -0,0 +1,95 @@
+from api.diff_parser import parse_diff, iter_diff_lines
+
+RENAME_DIFF = '''diff --git a/old name.py b/new name.py
+similarity index 90%
+rename from old name.py
+rename to new name.py
+index 1111111..2222222 100644
+--- a/old name.py
++++ b/new name.py
+@@ -1,3 +1,3 @@ def f():
+ x = 1
+--- removed comment
++++ added text
+ y = 2
+'''
+
+def test_rename_keeps_both_paths():
+    [record] = parse_diff(RENAME_DIFF)
+    assert record['status'] == 'renamed'
+    assert record['old_path'] == 'old name.py'
+    assert record['path'] == record['new_path'] == 'new name.py'
+
+def test_header_like_lines_inside_a_hunk_are_content():
+    [record] = parse_diff(RENAME_DIFF)
+    assert record['lines_removed'] == ['-- removed comment']
+    assert record['lines_added'] == ['++ added text']
+    [hunk] = record['hunks']
+    assert hunk['section'] == 'def f():'
+    assert hunk['lines'] == [
+        [' ', 1, 1, 'x = 1'],
+        ['-', 2, None, '-- removed comment'],
+        ['+', None, 2, '++ added text'],
+        [' ', 3, 3, 'y = 2'],
+    ]
+
+def test_binary_file_has_no_hunks():
+    diff = '''diff --git a/img.png b/img.png
+index 1111111..2222222 100644
+Binary files a/img.png and b/img.png differ
+diff --git a/a.py b/a.py
+--- a/a.py
++++ b/a.py
+@@ -1 +1 @@
+-1
++2
+'''
+    binary, text = parse_diff(diff)
+    assert binary['path'] == 'img.png'
+    assert binary['is_binary'] is True
+    assert binary['hunks'] == [] and binary['lines_added'] == []
+    assert text['path'] == 'a.py' and text['is_binary'] is False
+
+def test_added_and_deleted_files():
+    diff = '''diff --git a/data/b/x.py b/data/b/x.py
+new file mode 100644
+--- /dev/null
++++ b/data/b/x.py
+@@ -0,0 +1,2 @@
++a
++b
+diff --git a/gone.py b/gone.py
+deleted file mode 100644
+--- a/gone.py
++++ /dev/null
+@@ -1 +0,0 @@
+-z
+'''
+    added, deleted = parse_diff(diff)
+    # Only one 'b/' prefix is stripped
+    assert added['path'] == 'data/b/x.py'
+    assert added['status'] == 'added' and added['old_path'] is None
+    assert added['lines_added'] == ['a', 'b']
+    assert deleted['path'] == 'gone.py'
+    assert deleted['status'] == 'deleted' and deleted['new_path'] is None
+    assert deleted['lines_removed'] == ['z']
+
+def test_quoted_path_and_no_newline_marker():
+    diff = '''diff --git "a/q\\"uote.py" "b/q\\"uote.py"
+--- "a/q\\"uote.py"
++++ "b/q\\"uote.py"
+@@ -1 +1 @@
+-1
+\\ No newline at end of file
++2
+\\ No newline at end of file
+'''
+    [record] = parse_diff(diff)
+    assert record['path'] == 'q"uote.py'
+    assert record['lines_removed'] == ['1']
+    assert record['lines_added'] == ['2']
+
+def test_accepts_streamed_byte_lines():
+    lines = [line.encode('utf-8') + b'\r' for line in RENAME_DIFF.splitlines()]
+    assert list(iter_diff_lines(lines))[0] == 'diff --git a/old name.py b/new name.py'
+    assert list(parse_diff(lines)) == list(parse_diff(RENAME_DIFF))
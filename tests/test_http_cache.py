@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+from api.index import db
+from api.models import PR
+from api.http_cache import make_etag, not_modified
+
+def test_etag_depends_on_every_part():
+    etag = make_etag('1', 'abc', datetime(2024, 1, 1))
+    assert etag == make_etag('1', 'abc', datetime(2024, 1, 1))
+    assert etag != make_etag('1', 'abd', datetime(2024, 1, 1))
+    assert etag != make_etag('1', 'abc', None)
+    assert len(etag) == 32
+
+def test_not_modified_matches_if_none_match(app):
+    etag = make_etag('1')
+    last_modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with app.test_request_context(headers={'If-None-Match': f'"{etag}"'}):
+        response = not_modified(etag, last_modified)
+        assert response.status_code == 304
+        assert response.get_etag() == (etag, False)
+        assert response.last_modified == last_modified
+        assert response.headers['Cache-Control'] == 'no-cache'
+    with app.test_request_context(headers={'If-None-Match': '"other"'}):
+        assert not_modified(etag) is None
+    with app.test_request_context():
+        assert not_modified(etag) is None
+
+def test_not_modified_matches_compressed_etags(app):
+    etag = make_etag('1')
+    for encoding in ('gzip', 'br'):
+        with app.test_request_context(headers={'If-None-Match': f'"{etag}-{encoding}"'}):
+            assert not_modified(etag).status_code == 304
+
+def test_pr_endpoint_answers_conditional_gets(app):
+    db.session.add(PR(pr_id='1', title='t', status='OPEN', sourceBranchName='a', targetBranchName='b',
+                      content='C', feedback='F'))
+    db.session.commit()
+    client = app.test_client()
+    response = client.get('/api/pr/1')
+    etag = response.get_etag()[0]
+    assert response.status_code == 200 and etag
+
+    assert client.get('/api/pr/1', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+    db.session.get(PR, '1').feedback = 'Changed'
+    db.session.get(PR, '1').last_modified = datetime(2030, 1, 1)
+    db.session.commit()
+    assert client.get('/api/pr/1', headers={'If-None-Match': f'"{etag}"'}).status_code == 200
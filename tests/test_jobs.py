@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+from pytz import utc
+from api.index import db
+from api.models import ReviewJob
+import api.jobs as jobs
+
+def add_job(**values):
+    values.setdefault('attempts', 0)
+    job = ReviewJob(pr_id='1', targetBranchName='main', commitHash='c1', **values)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+def test_claim_next_job_claims_the_oldest_queued_job(app):
+    first = add_job(status='queued')
+    add_job(status='queued')
+    job = jobs.claim_next_job()
+    assert job.id == first.id
+    assert job.status == 'running' and job.attempts == 1 and job.started_date is not None
+
+def test_claim_next_job_waits_for_the_debounce_window(app):
+    add_job(status='queued', run_after=datetime.now(utc) + timedelta(minutes=5))
+    assert jobs.claim_next_job() is None
+
+def test_claim_next_job_reclaims_a_stale_running_job(app, monkeypatch):
+    monkeypatch.setenv("REVIEW_JOB_TIMEOUT", "60")
+    stale = add_job(status='running', attempts=1, started_date=datetime.now(utc) - timedelta(minutes=5))
+    add_job(status='running', attempts=1, started_date=datetime.now(utc))
+    job = jobs.claim_next_job()
+    assert job.id == stale.id
+    assert job.attempts == 2
+    # The job that is still within its timeout is left alone
+    assert jobs.claim_next_job() is None
+
+def test_drain_jobs_runs_until_the_queue_is_empty(app, monkeypatch):
+    ran = []
+
+    def run_job(job):
+        ran.append(job.id)
+        job.status = 'done'
+        db.session.commit()
+
+    monkeypatch.setattr(jobs, 'run_job', run_job)
+    ids = [add_job(status='queued').id for _ in range(3)]
+    assert jobs.drain_jobs(time_budget=30, job_seconds=1) == 3
+    assert ran == ids
+
+def test_drain_jobs_stops_claiming_near_the_time_limit(app):
+    add_job(status='queued')
+    assert jobs.drain_jobs(time_budget=5, job_seconds=10) == 0
+    assert ReviewJob.query.one().status == 'queued'
+
+def test_enqueue_review_coalesces_a_burst_of_pushes(app):
+    first = jobs.enqueue_review('1', 'main', 'c1')
+    db.session.commit()
+    second = jobs.enqueue_review('1', 'main', 'c2')
+    db.session.commit()
+    assert second.id == first.id
+    assert ReviewJob.query.count() == 1
+    assert ReviewJob.query.one().commitHash == 'c2'
+
+def test_enqueue_review_returns_the_job_already_queued_for_the_commit(app):
+    job = jobs.enqueue_review('1', 'main', 'c1')
+    db.session.commit()
+    assert jobs.enqueue_review('1', 'main', 'c1').id == job.id
+    assert ReviewJob.query.count() == 1
+
+def test_enqueue_review_queues_a_new_job_while_one_is_running(app):
+    running = add_job(status='running', started_date=datetime.now(utc))
+    job = jobs.enqueue_review('1', 'main', 'c2')
+    db.session.commit()
+    assert job.id != running.id
+    assert ReviewJob.query.count() == 2
+    # The running review is now out of date
+    assert jobs.is_superseded(running)
+
+def test_record_delivery_ignores_redeliveries(app):
+    assert jobs.record_delivery('uuid-1', '1') is True
+    db.session.commit()
+    assert jobs.record_delivery('uuid-1', '1') is False
+    assert jobs.record_delivery(None) is True
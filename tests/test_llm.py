@@ -0,0 +1,64 @@
+import os
+from types import SimpleNamespace
+from api.index import db
+from api.models import PR
+from api.llm import PromptStore, LLMGateway
+import api.rate_limit as rate_limit
+
+def test_prompt_versions_follow_the_text(tmp_path):
+    (tmp_path / 'review').write_text("Review this code\n")
+    store = PromptStore(directory=str(tmp_path), hot_reload=False)
+    assert store.get('review') == "Review this code"
+    version = store.version('review')
+    assert version == PromptStore(directory=str(tmp_path)).version('review')
+
+    (tmp_path / 'review').write_text("Review this code carefully")
+    # Without hot reload the template is read once
+    assert store.get('review') == "Review this code"
+    assert PromptStore(directory=str(tmp_path)).version('review') != version
+
+def test_prompt_hot_reload_reads_changed_files(tmp_path):
+    path = tmp_path / 'review'
+    path.write_text("v1")
+    store = PromptStore(directory=str(tmp_path), hot_reload=True)
+    assert store.get('review') == "v1"
+    path.write_text("v2")
+    os.utime(path, (1, 1))
+    assert store.get('review') == "v2"
+
+class FakeCompletions:
+    def __init__(self, results):
+        self.results = list(results)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=result))])
+
+class Throttled(Exception):
+    status_code = 429
+    response = SimpleNamespace(status_code=429, headers={'Retry-After': '0'})
+
+def gateway_with(completions):
+    gateway = LLMGateway(api_key='test')
+    gateway._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return gateway
+
+def test_gateway_retries_throttled_calls(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, 'sleep', lambda seconds: None)
+    completions = FakeCompletions([Throttled(), "answer"])
+    assert gateway_with(completions).chat([{'role': 'user', 'content': 'hi'}], model='m', temperature=0) == "answer"
+    assert len(completions.calls) == 2
+    assert completions.calls[0]['model'] == 'm' and completions.calls[0]['stream'] is False
+
+def test_chat_uses_the_configured_model(app, monkeypatch):
+    from api.routes import build_chat_payload
+    monkeypatch.setenv("GROQ_MODEL_NAME", "configured-model")
+    pr_entry = PR(pr_id='1', title='t', status='OPEN', sourceBranchName='a', targetBranchName='b', content='C',
+                  feedback='F')
+    db.session.add(pr_entry)
+    db.session.commit()
+    assert build_chat_payload(pr_entry, "What changed?")['model'] == "configured-model"
@@ -0,0 +1,79 @@
+import pytest
+from sqlalchemy import create_engine
+from api.index import db
+from api.models import RateLimitBucket
+import api.rate_limit as rate_limit
+from api.rate_limit import TokenBucket, DatabaseTokenBucket, call_with_backoff
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock)
+    monkeypatch.setattr(rate_limit.time, 'time', clock)
+    return clock
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket('test', capacity=60, period=60.0)
+    assert bucket._take(60) == 0
+    # Empty: one token refills per second
+    assert bucket._take(1) == pytest.approx(1.0)
+    clock.now += 10
+    assert bucket._take(10) == 0
+    assert bucket._take(1) == pytest.approx(1.0)
+
+def test_token_bucket_never_refills_beyond_capacity(clock):
+    bucket = TokenBucket('test', capacity=10, period=10.0)
+    clock.now += 3600
+    assert bucket._take(10) == 0
+    assert bucket._take(1) == pytest.approx(1.0)
+
+def test_acquire_waits_for_tokens(clock, monkeypatch):
+    def sleep(seconds):
+        clock.now += seconds
+
+    monkeypatch.setattr(rate_limit.time, 'sleep', sleep)
+    bucket = TokenBucket('test', capacity=2, period=2.0)
+    assert bucket.acquire(2) == 0
+    assert bucket.acquire(1) == pytest.approx(1.0)
+    # A request larger than the bucket waits for a full bucket
+    assert bucket.acquire(5) == pytest.approx(2.0)
+
+def test_database_bucket_is_shared_between_instances(app, clock):
+    first = DatabaseTokenBucket('test', capacity=5, period=60.0, engine=db.engine)
+    second = DatabaseTokenBucket('test', capacity=5, period=60.0, engine=db.engine)
+    assert [first._take(1) for _ in range(3)] == [0, 0, 0]
+    assert [second._take(1) for _ in range(2)] == [0, 0]
+    assert first._take(1) == pytest.approx(12.0)
+    assert db.session.get(RateLimitBucket, 'test').tokens == pytest.approx(0)
+
+def test_database_bucket_falls_back_to_this_process_when_the_database_fails(clock, tmp_path):
+    bucket = DatabaseTokenBucket('test', capacity=2, period=60.0,
+                                 engine=create_engine(f"sqlite:///{tmp_path}/missing/dir/bucket.db"))
+    assert bucket._take(1) == 0
+    assert bucket._take(1) == 0
+    # Still limited rather than let through
+    assert bucket._take(1) == pytest.approx(30.0)
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def test_call_with_backoff_retries_throttled_calls(monkeypatch):
+    delays = []
+    monkeypatch.setattr(rate_limit.time, 'sleep', delays.append)
+    responses = iter([Response(429, {'Retry-After': '3'}), Response(503), Response(200)])
+    assert call_with_backoff('test', lambda: next(responses), base_delay=0.0).status_code == 200
+    assert len(delays) == 2
+    assert delays[0] == pytest.approx(3.0)
+
+def test_call_with_backoff_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(rate_limit.time, 'sleep', lambda seconds: None)
+    assert call_with_backoff('test', lambda: Response(429), max_retries=2).status_code == 429
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+import api.retrieval as retrieval
+from api.retrieval import tokenize, diff_chunks, BM25Index, get_pr_index, retrieve_context
+
+def file_diff(path, added):
+    lines = "".join(f"+{line}\n" for line in added)
+    return (f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n"
+            f"@@ -1,0 +1,{len(added)} @@\n{lines}")
+
+DIFF = (file_diff("api/cache.py", ["def get_file_cache(key):", "    return FileContentCache.lookup(key)"])
+        + file_diff("api/auth.py", ["def check_token(token):", "    return token in VALID_TOKENS"]))
+
+def test_tokenize_splits_identifiers():
+    tokens = tokenize("get_file_cache FileContentCache x2")
+    assert {'get_file_cache', 'file', 'cache', 'filecontentcache', 'content', 'x2'} <= set(tokens)
+
+def test_diff_chunks_per_hunk():
+    chunks = diff_chunks(DIFF)
+    assert [chunk['path'] for chunk in chunks] == ['api/cache.py', 'api/auth.py']
+    assert chunks[0]['text'].splitlines()[:3] == ["Path: api/cache.py", "@@ -1,0 +1,2 @@", "+def get_file_cache(key):"]
+
+def test_long_hunks_are_split():
+    chunks = diff_chunks(file_diff("a.py", [f"line {i}" for i in range(5)]), max_lines=2)
+    assert len(chunks) == 3
+    assert chunks[2]['text'].splitlines()[2:] == ["+line 4"]
+
+def test_search_ranks_matching_chunks():
+    index = BM25Index(diff_chunks(DIFF))
+    assert index.search("how does the file cache work?", 5) == [0]
+    assert index.search("token check", 5) == [1]
+    assert index.search("unrelated words", 5) == []
+
+def test_indexes_are_cached_per_commit(monkeypatch):
+    monkeypatch.setattr(retrieval, '_indexes', retrieval.OrderedDict())
+    index = get_pr_index('1', 'abc', DIFF)
+    assert get_pr_index('1', 'abc', "") is index
+    assert get_pr_index('1', 'def', DIFF) is not index
+
+def test_retrieve_context(monkeypatch):
+    monkeypatch.setattr(retrieval, '_indexes', retrieval.OrderedDict())
+    small = SimpleNamespace(pr_id='1', lastCommitHash='abc', content="small", rawDiff=DIFF)
+    assert retrieve_context(small, "anything") == "small"
+
+    monkeypatch.setenv("CHAT_CONTEXT_TOKENS", "70")
+    large = SimpleNamespace(pr_id='2', lastCommitHash='abc', content="x " * 1000, rawDiff=DIFF)
+    context = retrieve_context(large, "token check")
+    assert context.startswith("Files changed: api/cache.py, api/auth.py")
+    assert "check_token" in context and "get_file_cache" not in context
+    # Only one chunk fits in the budget; without a match it is the first one
+    assert "get_file_cache" in retrieve_context(large, "summarise this")
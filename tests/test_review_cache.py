@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from pytz import utc
+from api.index import db
+from api.models import ReviewCache
+from api.review_cache import review_cache_key, get_cached_review, store_review
+import api.utils as utils
+
+MESSAGES = [{'role': 'system', 'content': 'Review this'}, {'role': 'user', 'content': 'diff'}]
+
+def test_cache_key_depends_on_messages_model_and_params():
+    key = review_cache_key(MESSAGES, 'model-a', {'temperature': 0.5})
+    assert key == review_cache_key(MESSAGES, 'model-a', {'temperature': 0.5})
+    assert key != review_cache_key(MESSAGES, 'model-b', {'temperature': 0.5})
+    assert key != review_cache_key(MESSAGES, 'model-a', {'temperature': 0.7})
+    assert key != review_cache_key(MESSAGES[:1], 'model-a', {'temperature': 0.5})
+
+def test_store_and_hit(app):
+    store_review('k1', 'model-a', 'feedback')
+    assert get_cached_review('k1') == 'feedback'
+    assert db.session.get(ReviewCache, 'k1').hits == 1
+    assert get_cached_review('missing') is None
+
+def test_storing_the_same_key_twice_keeps_the_first(app):
+    store_review('k1', 'model-a', 'first')
+    store_review('k1', 'model-a', 'second')
+    assert get_cached_review('k1') == 'first'
+
+def test_expired_entries_are_misses(app, monkeypatch):
+    monkeypatch.setenv("REVIEW_CACHE_TTL_SECONDS", "60")
+    store_review('k1', 'model-a', 'feedback')
+    db.session.get(ReviewCache, 'k1').created_date = datetime.now(utc) - timedelta(minutes=5)
+    db.session.commit()
+    assert get_cached_review('k1') is None
+    assert db.session.get(ReviewCache, 'k1') is None
+
+def test_least_recently_used_entries_are_evicted(app, monkeypatch):
+    monkeypatch.setenv("REVIEW_CACHE_MAX_ENTRIES", "2")
+    for key in ('k1', 'k2', 'k3'):
+        store_review(key, 'model-a', key)
+    assert get_cached_review('k1') is None
+    assert get_cached_review('k3') == 'k3'
+
+def test_analyze_batches_only_sends_cache_misses(app, monkeypatch):
+    sent = []
+
+    def analyze_code_with_llm(prompt, data):
+        sent.append(data)
+        return f"review of {data}"
+
+    monkeypatch.setattr(utils, 'analyze_code_with_llm', analyze_code_with_llm)
+    assert utils.analyze_batches_with_cache('prompt', ['a', 'b']) == ['review of a', 'review of b']
+    assert utils.analyze_batches_with_cache('prompt', ['b', 'c']) == ['review of b', 'review of c']
+    assert sent == ['a', 'b', 'c']
@@ -0,0 +1,59 @@
+from api.diff_parser import parse_diff
+from api.chunking import split_review_sections
+from api.utils import cancel_unchanged_lines
+import api.utils as utils
+
+def test_moved_lines_cancel_out():
+    added, removed = cancel_unchanged_lines(['a', 'b', 'c'], ['b', 'd'])
+    assert added == ['a', 'c']
+    assert removed == ['d']
+
+def test_lines_cancel_as_a_multiset():
+    # A line added three times and removed once is still added twice
+    added, removed = cancel_unchanged_lines(['x', 'y', 'x', 'x'], ['x'])
+    assert added == ['y', 'x', 'x']
+    assert removed == []
+
+def test_order_is_kept():
+    added, removed = cancel_unchanged_lines(['3', '1', '2', '1'], ['1', '4', '1', '1'])
+    assert added == ['3', '2']
+    assert removed == ['4', '1']
+
+def test_empty_inputs():
+    assert cancel_unchanged_lines([], []) == ([], [])
+    assert cancel_unchanged_lines(['a'], []) == (['a'], [])
+
+def file_item(path, removed, added):
+    [item] = parse_diff(f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n@@ -1,2 +1,2 @@\n x = 1\n"
+                        f"-{removed}\n+{added}\n")
+    item['original_contents'] = f"x = 1\n{removed}\n"
+    return item
+
+def test_incremental_review_only_sends_changed_files(app, monkeypatch):
+    calls = []
+
+    def analyze_batches_with_cache(prompt, batches):
+        calls.append(batches)
+        return [f"***Description***\nReview {len(calls)}\n\n***Suggestions***\n1. Fix a.py\n2. Fix b.py"
+                for _ in batches]
+
+    monkeypatch.setattr(utils, 'analyze_batches_with_cache', analyze_batches_with_cache)
+    file_reviews = {}
+    utils.review_files_incrementally('1', 'prompt', [file_item('a.py', 'a', 'a2'), file_item('b.py', 'b', 'b2')],
+                                     file_reviews)
+    # Both files go into one batch and the review is split back per file
+    assert len(calls) == 1 and len(calls[0]) == 1
+    assert split_review_sections(file_reviews['a.py']['feedback'])[1] == ["Fix a.py"]
+    assert split_review_sections(file_reviews['b.py']['feedback'])[1] == ["Fix b.py"]
+
+    utils.review_files_incrementally('1', 'prompt', [file_item('a.py', 'a', 'a2'), file_item('b.py', 'b', 'b3')],
+                                     file_reviews)
+    assert len(calls) == 2
+    assert "Path: b.py" in calls[1][0] and "Path: a.py" not in calls[1][0]
+    assert file_reviews['a.py']['reviewed'] is False
+    assert "Review 1" in file_reviews['a.py']['feedback'] and "Review 2" in file_reviews['b.py']['feedback']
+
+    utils.review_files_incrementally('1', 'prompt', [file_item('a.py', 'a', 'a2'), file_item('b.py', 'b', 'b3')],
+                                     file_reviews)
+    # Nothing changed, so there is nothing to send
+    assert calls[2] == []